@@ -1,3 +1,9 @@
 from flask import Flask
 app = Flask(__name__)
+
+# The modules import each other by their flat names, as when run as scripts
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
 from insight_project import dashboard
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+import gzip # For compressing responses
+import hashlib # For ETags from the snapshot's data
+import json # For response bodies
+from functools import lru_cache # For caching responses per snapshot
+
+# For serving the aggregates
+from flask import Blueprint, Response, request
+
+# For the latency of API requests
+from instrumentation import metrics
+
+# For lift, p-values and confidence intervals
+from figures import lift_table
+from campaign_store import store_columns
+
+# Number of responses kept per snapshot
+cache_size = 256
+
+# Responses smaller than this many bytes aren't worth compressing
+min_gzip_size = 500
+
+
+class BadRequest(Exception):
+    """A request for a campaign or dates the snapshot doesn't have."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _json(value):
+    # NumPy scalars and dates as plain JSON values
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+    raise TypeError(type(value))
+
+
+def _records(frame):
+    # Rows of a DataFrame as dictionaries, NaN as null
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def _days(dates):
+    return np.datetime_as_string(np.asarray(dates, dtype='datetime64[D]'),
+                                 unit='D').tolist()
+
+
+def _span(store, campaign, args):
+    # The campaign and the dates asked for, by default every day with data
+    if campaign is None:
+        raise BadRequest('campaign is required')
+    if campaign not in store.campaigns():
+        raise BadRequest('no campaign {}'.format(campaign), status=404)
+    try:
+        start = pd.to_datetime(args.get('start', '1970-01-01'))
+        end = pd.to_datetime(args.get('end', store.max_date()))
+    except ValueError:
+        raise BadRequest('start and end should be dates (YYYY-MM-DD)')
+    if start > end:
+        raise BadRequest('start is after end')
+    first = pd.Timestamp(np.min(store.columns['Date']))
+    if start > store.max_date() or end < first:
+        raise BadRequest('no data between {:%Y-%m-%d} and {:%Y-%m-%d} (data '
+                         'run from {:%Y-%m-%d} to {:%Y-%m-%d})'.format(
+                             start, end, first, store.max_date()))
+    return start, end
+
+
+def campaigns_body(store, args):
+    """Every campaign with its conditions and their sizes."""
+    return {
+        'max_date': store.max_date(),
+        'campaigns': [{
+            'campaign': campaign,
+            'conditions': [{
+                'condition': i,
+                'size': store.size(campaign, i)
+            } for i in store.conditions(campaign)]
+        } for campaign in store.campaigns()]
+    }
+
+
+def counts_body(store, args):
+    """Daily submissions and size of every condition of a campaign between
+    the start and end dates (inclusive).
+    """
+    campaign = args.get('campaign')
+    start, end = _span(store, campaign, args)
+    conditions = []
+    for i in store.conditions(campaign):
+        dates, counts = store.window(campaign, i, start, end)
+        conditions.append({
+            'condition': i,
+            'size': store.size(campaign, i),
+            'total': store.total(campaign, i, start, end),
+            'dates': _days(dates),
+            'counts': np.asarray(counts).tolist()
+        })
+    return {
+        'campaign': campaign,
+        'start': start,
+        'end': end,
+        'study_size': store.study_size(campaign, start, end),
+        'conditions': conditions
+    }
+
+
+def lift_body(store, args):
+    """Lift of each treatment of a campaign over its control between the
+    start and end dates, with confidence intervals and p-values, as on the
+    dashboard.
+    """
+    campaign = args.get('campaign')
+    start, end = _span(store, campaign, args)
+    if 'Control' not in store.conditions(campaign):
+        raise BadRequest('campaign {} has no control'.format(campaign),
+                         status=404)
+    return {
+        'campaign': campaign,
+        'start': start,
+        'end': end,
+        'treatments': _records(lift_table(store, campaign, start, end))
+    }
+
+
+# Endpoints by name
+bodies = {
+    'campaigns': campaigns_body,
+    'counts': counts_body,
+    'lift': lift_body
+}
+
+
+@lru_cache(maxsize=8)
+def snapshot_etag(snapshot):
+    """Return an ETag for a snapshot: a hash of its columns, so every
+    worker serving the same data gives the same tag, and rebuilds that
+    change nothing keep it.
+    """
+    digest = hashlib.sha1()
+    for i in store_columns:
+        column = np.asarray(snapshot.store.columns[i])
+        if column.dtype == object:
+            column = column.astype(str)
+        digest.update(i.encode())
+        digest.update(np.ascontiguousarray(column).tobytes())
+    return digest.hexdigest()[:20]
+
+
+@lru_cache(maxsize=cache_size)
+def cached_response(snapshot, name, args):
+    """Return the status, JSON body and gzipped body (or None when too small
+    to be worth it) of an endpoint for a snapshot and its query arguments (a
+    tuple of pairs); each is built and compressed once per snapshot.
+    """
+    try:
+        status, body = 200, bodies[name](snapshot.store, dict(args))
+    except BadRequest as error:
+        status, body = error.status, {'error': str(error)}
+    body = json.dumps(body, default=_json, separators=(',', ':')).encode()
+    compressed = gzip.compress(body) if len(body) >= min_gzip_size else None
+    return status, body, compressed
+
+
+def aggregates_api(current_snapshot):
+    """Return a Flask blueprint serving the aggregated campaign data of
+    current_snapshot() (a function returning the current Snapshot) as JSON
+    under /api: /api/campaigns, /api/counts and /api/lift (with campaign and
+    optionally start and end as query arguments).
+    Responses carry a weak ETag of the snapshot's data, so clients sending
+    it back in If-None-Match get a 304 until the data change; bodies are
+    gzipped for clients accepting it and cached per snapshot, so repeated
+    requests don't recompute anything.
+    """
+    api = Blueprint('api', __name__, url_prefix='/api')
+
+    @api.route('/<name>')
+    @metrics.timer('api')
+    def serve(name):
+        if name not in bodies:
+            return Response(json.dumps({'error': 'no endpoint ' + name},
+                                       separators=(',', ':')),
+                            status=404, mimetype='application/json')
+        snapshot = current_snapshot()
+        etag = snapshot_etag(snapshot)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            status, body, compressed = cached_response(
+                snapshot, name, tuple(sorted(request.args.items())))
+            if (compressed is not None and
+                    request.accept_encodings['gzip'] > 0):
+                response = Response(compressed, status=status,
+                                    mimetype='application/json')
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = Response(body, status=status,
+                                    mimetype='application/json')
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return api
@@ -0,0 +1,83 @@
+// Builds the campaign figure in the browser from the payload made by
+// figures.counts_payload, so switching between raw and adjusted counts or
+// picking other dates doesn't go back to the server (binned payloads are
+// rebuilt by the server for the picked dates, and only trimmed here to them)
+
+// Round half to even, as NumPy does
+function roundHalfEven(x) {
+    var rounded = Math.round(x);
+    if (Math.abs(x % 1) === 0.5 && rounded % 2 !== 0) {
+        rounded -= 1;
+    }
+    return rounded;
+}
+
+// Picked dates (YYYY-MM-DD, perhaps with a time) as YYYY-MM-DDTHH:MM:SS
+// strings, which compare in time order
+function asTime(date) {
+    var time = String(date).replace(' ', 'T');
+    return time.length === 10 ? time + 'T00:00:00' : time;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    campaign: {
+        figure: function(payload, start_date, end_date, value_counts) {
+            if (!payload) {
+                return {data: [], layout: {}};
+            }
+
+            // Keep the days between the picked dates, inclusive
+            var start = start_date ? asTime(start_date) : null;
+            var end = end_date ? asTime(end_date) : null;
+            var windows = payload.series.map(function(series) {
+                var x = [];
+                var y = [];
+                for (var i = 0; i < series.x.length; i++) {
+                    var day = series.x[i] + 'T00:00:00';
+                    if ((start === null || day >= start) &&
+                            (end === null || day <= end)) {
+                        x.push(series.x[i]);
+                        y.push(series.y[i]);
+                    }
+                }
+                return {name: series.name, x: x, y: y, size: series.size};
+            });
+
+            // Applicants in the study: the distinct sizes of conditions with
+            // days in the span
+            var sizes = [];
+            windows.forEach(function(series) {
+                if (series.x.length && sizes.indexOf(series.size) < 0) {
+                    sizes.push(series.size);
+                }
+            });
+            var study_size = sizes.reduce(function(a, b) {
+                return a + b;
+            }, 0);
+
+            var data = windows.map(function(series) {
+                var y = series.y;
+                if (value_counts === 'adjusted') {
+                    y = y.map(function(count) {
+                        return roundHalfEven((count / series.size) *
+                            (study_size / (payload.n_conditions - 1)));
+                    });
+                }
+                return {type: 'scatter', x: series.x, y: y,
+                        name: series.name};
+            });
+
+            var title = 'Number of Submissions';
+            if (payload.days_per_point > 1) {
+                title = 'Submissions per ' + payload.days_per_point + ' Days';
+            }
+            return {
+                data: data,
+                layout: {
+                    yaxis: {title: {text: title}},
+                    legend: {x: 0.05, y: 1.1}
+                }
+            };
+        }
+    }
+});
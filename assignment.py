@@ -7,7 +7,23 @@ import pandas as pd
 
 # Other utilities
 import datetime as dt # For datetime
-import psycopg2 # For querying databases
+import connections # For pooled database connections
+
+# For extracting data from the application databases
+from extraction import (execute_query, stream_query, extract_incremental,
+                        completed_query, completed_columns, apps_query,
+                        apps_columns, latest_completed_query,
+                        eligible_apps_query, eligible_columns,
+                        extract_concurrently, timed)
+from extract_cache import cached_query
+from persistence import write_assignments
+from schema import compact
+from eligibility import flag_eligible, assign_partition
+from partitions import reset_partitions, write_partitions, map_partitions
+from randomization import assign_groups
+from instrumentation import metrics
+from cleaning import (clean_applications, clean_completed, start_date,
+                      writing_questions)
 
 # Create a dictionary with group names and their size in proportion to each 
 # other. This is the 'interactive' portion of the script.
@@ -15,188 +31,294 @@ groups = pd.DataFrame({
     'Control': .20, 'Generic': .40, 'Personalized': .40
     }.items(), columns=['group', 'size'])
 
-# Function to execute SQL queries
-def execute_query(query, connection, args=None):
-    con = connection
-    cur = con.cursor()
-    if args:
-        cur.execute(query, args)
-    else:
-        cur.execute(query)
-
-    results = cur.fetchall()
-    cur.close()
-    con.close()
-    return results
-
-# Get data on finished applications from greenhouse server
-greenhouse = open('credentials_greenhouse.txt').readlines()
-connection = psycopg2.connect(database=greenhouse[0].strip(),
-                           user=greenhouse[1].strip(),
-                           password=greenhouse[2].strip(),
-                           host=greenhouse[3].strip(),
-                           port=greenhouse[4].strip())
-
-# Extract relevant columns
-all_completed = execute_query(query = """
-SELECT hashed_email_address, year, session, application_submission_date,
-       currnent_stage_in_greenhouse, do_not_interview_tag 
-FROM completed_apps;
-""", connection = connection)
-
-# Convert to a pandas DataFrame
-all_completed = pd.DataFrame(all_completed,
-                             columns=[
-                                 'hashed_email_address', 'year', 'session',
-                                 'application_submission_date', 'status',
-                                 'dont_interview'
-                             ])
-
-# Get data on unfinished applications from heroku server
-heroku = open('credentials_heroku.txt').readlines()
-connection = psycopg2.connect(database=heroku[0].strip(),
-                           user=heroku[1].strip(),
-                           password=heroku[2].strip(),
-                           host=heroku[3].strip(),
-                           port=heroku[4].strip())
-
-# Extract relevant columns
-all_apps = execute_query("""
-SELECT hashed_email_address, program, created_at, updated_at, ai_motivation, 
-       ai_tools, coursework, dc_education, dc_innovation,
-       dc_motivation, de_motivation, debugging, dev_ops_motivation,
-       ds_motivation, largest_codebase, largest_team,
-       ml_innovation, ml_problem, networking, sec_motivation,
-       sec_tradeoffs, side_projects, statistical_methods,
-       technical_tradeoffs, tools
-FROM consulting_heroku_export;
-""", connection = connection)
-
-# Convert to a pandas DataFrame
-all_apps = pd.DataFrame(
-    all_apps,
-    columns=[
-        'hashed_email_address', 'program', 'created_at', 'updated_at',
-        'ai_motivation', 'ai_tools', 'coursework', 'dc_education',
-        'dc_innovation', 'dc_motivation', 'de_motivation', 'debugging',
-        'dev_ops_motivation', 'ds_motivation', 'largest_codebase',
-        'largest_team', 'ml_innovation', 'ml_problem', 'networking',
-        'sec_motivation', 'sec_tradeoffs', 'side_projects',
-        'statistical_methods', 'technical_tradeoffs', 'tools'
-    ])
-
-# Replace empty strings with NaN
-all_apps.replace("", np.nan, inplace = True)
-
-
-# Do some basic cleaning; delete accounts before 4/19/19 at 7:30 (testing)
-start_date = pd.to_datetime('2019-04-19 07:30:00.0')
-all_apps = all_apps[all_apps['created_at'] > start_date]
-
-# Remove applications with gibberish responses
-writing_questions = [
-    'ai_motivation', 'ai_tools', 'coursework', 'dc_education', 'dc_innovation',
-    'dc_motivation', 'de_motivation', 'debugging', 'dev_ops_motivation',
-    'ds_motivation', 'largest_codebase', 'largest_team', 'ml_innovation',
-    'ml_problem', 'networking', 'sec_motivation', 'sec_tradeoffs',
-    'side_projects', 'statistical_methods', 'technical_tradeoffs', 'tools'
-]
-
-gibberish = all_apps[writing_questions].copy()  # Extract all question data
-
-# Loop to indicate whether each response had one space
-for i in range(gibberish.columns.size):
-    gibberish.iloc[:, i] = gibberish.iloc[:, i].str.contains(' ') == False
-
-# Use cutoff of five responses without spaces
-keep_applications = gibberish.sum(axis=1, skipna=True) < 5
-
-# Remove data without any spaces in 5 or more columns, as gibberish responses
-# typically don't have any spaces
-all_apps = all_apps[keep_applications]
-
-#Subset only relevant columns
-all_apps = all_apps[['hashed_email_address', 'program', 'updated_at']]
-
-# Change data to datetype format in completed app dataset
-all_completed['application_submission_date'] = pd.to_datetime(
-    all_completed['application_submission_date'],
-    infer_datetime_format=True).dt.tz_localize(None)
-
-# Drop duplicates from completed file
-all_completed.sort_values(by='application_submission_date',
-                          ascending=False,
-                          inplace=True)
-all_completed.drop_duplicates('hashed_email_address', inplace=True)
-
-# Create a feature indicating cohort
-all_completed['cohort'] = all_completed['year'].astype(str).str.cat(
-    all_completed['session'])
-
-#Merge all and completed applications
-df = all_apps.merge(all_completed, how = 'left', on = 'hashed_email_address')
-
-# Identify applicants to A/B test
-# Calculate days since an application was last completed
-df['days_since_updated'] = (pd.to_datetime('today') - df['updated_at']).dt.days
-
-# Create a boolean indicating whether an app has been updated in last 6 months
-df['updated_recent'] = df['days_since_updated'] < (365 / 2)
-
-# Create a variable indicating current session
-current_session = df['cohort'].sort_values(ascending = False).iloc[0]
-
-# Create a boolean indicating if an app was submitted in the current session
-df['current_submission'] = df['cohort'] == current_session
-
-# Create a boolean indicating whether an applicant was accepted in a prior session
-df['accepted'] = df['status'] == 'Accepted'
-
-# Create a boolean indicating who has information about their program
-df['has_program'] = df['program'].notna() 
-
-# Create a boolean indicating who reported interest in the top four programs
+# Set to True to fetch only rows changed since the last run and merge them
+# into the locally stored snapshots (the first run still does a full load)
+incremental = False
+snapshot_dir = 'snapshots'
+
+# Set to True to stream full loads of the heroku export through a server-side
+# cursor and clean them itersize rows at a time (used when not incremental)
+streaming = False
+itersize = 10000
+
+# Set to True to keep full loads in a local columnar cache, re-querying a
+# source only when its row count or latest timestamp (or, for completed_apps,
+# any applicant's stage or interview tag) has changed (used when neither
+# pushdown nor incremental)
+cache_extracts = True
+
+# Set to True to let the databases do the dedup, cleaning and eligibility
+# filters, so that only candidates to nudge are transferred
+pushdown = False
+
+# Set to True to join, flag and assign the applications in partitions (by a
+# hash of the email) across a process pool, so the merged frame never has to
+# fit in memory; with streaming, the heroku export goes to disk chunk by chunk
+partitioned = False
+partition_dir = 'partitions'
+n_partitions = 16
+processes = 4
+
+# Set to True to query the greenhouse and heroku databases in parallel
+concurrent = True
+
+# Where to store the assignments: the campaign database (read by the
+# dashboard) and/or a csv file of emails for the mail-out
+save_to_table = True
+save_to_csv = True
+
+# Where to write a JSON report of the run (how long each stage took, peak
+# memory and row counts); None for no report
+run_report = 'run_report_' + pd.to_datetime('today').strftime(
+    "%m-%d-%Y") + '.json'
+
+# Programs whose applicants are nudged (the top four programs)
 top_four = [
     'Data Science', 
     'Artificial Intelligence', 
     'Data Engineering',
     'Health Data Science'
 ]
-df['top_four'] = df['program'].isin(top_four)
-
-# Create a boolean indicating who to nudge:
-# 1) Activity in the past 6 months
-# 2) No submission in current cycle
-# 3) Has information about a program of interest
-# 4) Not accepted to Insight already
-# 5) Not on avoid list
-df['to_nudge'] = (
-    (df['updated_recent']) & 
-    (df['current_submission'] == False) & 
-    (df['top_four']) & 
-    (df['accepted'] == False) & 
-    ((df['dont_interview'] == False) | df['dont_interview'].isna())
-                 )
-
-# Create a string with today's date to track campaign
-todays_date = 'campaign_' + pd.to_datetime('today').strftime("%m/%d/%Y")
-
-# Divide groups (see top of script) so that their totals sum to 100 
-# (if user inputs precentages or whole numbers)
-groups['size'] = groups['size'] / groups['size'].sum()
-
-# Create an empty column to add in random assignment
-df[todays_date] = np.nan
-
-# Populate column with random assignment
-df.loc[df['to_nudge'], todays_date] = np.random.choice(groups['group'],
-                                                      df['to_nudge'].sum(),
-                                                      p=groups['size'])
-
-# Create a csv file with emails randomly assigned to campaigns
-email_list = df.loc[df[todays_date].notna(
-), ['hashed_email_address', 'program', todays_date]]
-email_list.sort_values(todays_date, inplace=True)
-email_list.to_csv('email_list_' +
-                  pd.to_datetime('today').strftime("%m-%d-%Y") + '.csv',
-                  index=False)
+
+
+# Function to get data on finished applications from greenhouse server
+@metrics.stage('extract greenhouse')
+def extract_completed():
+    connection = connections.connect('greenhouse')
+
+    # Extract relevant columns and convert to a pandas DataFrame
+    if pushdown:
+        all_completed = execute_query(latest_completed_query,
+                                      connection=connection)
+        all_completed = pd.DataFrame(all_completed,
+                                     columns=completed_columns)
+    elif incremental:
+        all_completed = extract_incremental(
+            'completed_apps', completed_query, completed_columns,
+            watermark='application_submission_date',
+            keys=['hashed_email_address', 'application_submission_date'],
+            connection=connection, snapshot_dir=snapshot_dir)
+    elif cache_extracts:
+        # Stages and tags are edited in place, without a new submission, so
+        # they are hashed into the check too
+        all_completed = cached_query(
+            'greenhouse', completed_query + ';', completed_columns,
+            connection=connection, table='completed_apps',
+            timestamp='application_submission_date',
+            date_columns=['application_submission_date'],
+            checksum=['hashed_email_address', 'currnent_stage_in_greenhouse',
+                      'do_not_interview_tag'])
+    else:
+        all_completed = execute_query(query=completed_query + ';',
+                                      connection=connection)
+        all_completed = pd.DataFrame(all_completed,
+                                     columns=completed_columns)
+
+    # Integer email keys and categoricals from here on
+    return compact(all_completed, 'greenhouse', memory)
+
+
+# Function to get data on unfinished applications from heroku server
+@metrics.stage('extract heroku')
+def extract_apps():
+    connection = connections.connect('heroku')
+
+    # Extract relevant columns and convert to a pandas DataFrame, then
+    # replace empty strings, drop test accounts and gibberish responses, and
+    # keep only the relevant columns
+    if pushdown:
+        # The database does the cleaning and eligibility filters, so only
+        # candidates to nudge come over the wire (183 days matches the
+        # days_since_updated < 365 / 2 check below)
+        query, args = eligible_apps_query(
+            writing_questions, start_date,
+            recent_cutoff=pd.to_datetime('today') - pd.Timedelta(days=183),
+            programs=top_four)
+        all_apps = execute_query(query, connection=connection, args=args)
+        all_apps = pd.DataFrame(all_apps, columns=eligible_columns)
+    elif incremental:
+        all_apps = extract_incremental(
+            'consulting_heroku_export', apps_query, apps_columns,
+            watermark='updated_at',
+            keys=['hashed_email_address', 'created_at'],
+            connection=connection, snapshot_dir=snapshot_dir)
+        all_apps = clean_applications(all_apps)
+    elif streaming and partitioned:
+        # Write each cleaned chunk straight to the partitions, so the export
+        # is never held in memory whole
+        chunks = stream_query(apps_query + ';', connection, apps_columns,
+                              itersize=itersize)
+        for part, chunk in enumerate(chunks):
+            write_partitions(compact(clean_applications(chunk)),
+                             partition_dir, 'apps', n_partitions, part)
+        return None
+    elif streaming:
+        # Clean one chunk at a time so that the essay text is never held in
+        # memory for the whole table
+        chunks = [
+            clean_applications(chunk)
+            for chunk in stream_query(apps_query + ';', connection,
+                                      apps_columns, itersize=itersize)
+        ]
+
+        # An empty export streams no chunks
+        if chunks:
+            all_apps = pd.concat(chunks, ignore_index=True)
+        else:
+            all_apps = clean_applications(
+                pd.DataFrame(columns=apps_columns))
+    elif cache_extracts:
+        all_apps = cached_query(
+            'heroku', apps_query + ';', apps_columns,
+            connection=connection, table='consulting_heroku_export',
+            timestamp='updated_at', date_columns=['created_at', 'updated_at'])
+        all_apps = clean_applications(all_apps)
+    else:
+        all_apps = execute_query(apps_query + ';', connection=connection)
+        all_apps = pd.DataFrame(all_apps, columns=apps_columns)
+        all_apps = clean_applications(all_apps)
+
+    # Integer email keys and categoricals from here on
+    return compact(all_apps, 'heroku', memory)
+
+
+# Memory of each extract before and after compacting, for the run report
+memory = {}
+
+
+def main():
+    """Run the daily job: extract, merge, flag, assign and export."""
+    # Extract from both databases at the same time, cleaning the completed
+    # apps while the (larger) heroku export is still being fetched
+    timings = {}
+    if partitioned:
+        reset_partitions(partition_dir)
+    if concurrent:
+        futures = extract_concurrently({
+            'greenhouse': extract_completed,
+            'heroku': extract_apps
+        }, timings)
+        all_completed = clean_completed(futures['greenhouse'].result())
+        all_apps = futures['heroku'].result()
+    else:
+        all_completed = clean_completed(
+            timed(extract_completed, 'greenhouse', timings))
+        all_apps = timed(extract_apps, 'heroku', timings)
+
+    # Report how long each source took
+    for source, seconds in timings.items():
+        print('Extracted {} in {:.1f} s'.format(source, seconds))
+
+    # Report the memory saved by the compact dtypes
+    for source, (before, after) in memory.items():
+        print('Compacted {} from {:.1f} MB to {:.1f} MB'.format(
+            source, before / 2**20, after / 2**20))
+
+    # Create a string with today's date to track campaign
+    todays_date = 'campaign_' + pd.to_datetime('today').strftime("%m/%d/%Y")
+
+    # Divide groups (see top of script) so that their totals sum to 100 
+    # (if user inputs precentages or whole numbers)
+    groups['size'] = groups['size'] / groups['size'].sum()
+
+    # Row counts for the run report
+    rows = {'completed': len(all_completed)}
+    if all_apps is not None:
+        rows['applications'] = len(all_apps)
+
+    if partitioned:
+        # The current session is the latest cohort of any completed app, since
+        # no partition sees every merged app
+        current_session = all_completed['cohort'].sort_values(
+            ascending=False).iloc[0]
+
+        # Bucket both inputs by email key on disk (a streamed heroku export is
+        # already there), then merge, flag and assign each bucket in its own
+        # process, keeping only the applicants nudged; groups come from a hash
+        # of each email, so they don't depend on the partitioning
+        with metrics.stage('write partitions'):
+            if all_apps is not None:
+                write_partitions(all_apps, partition_dir, 'apps', n_partitions)
+            write_partitions(
+                all_completed.drop(columns='hashed_email_address'),
+                partition_dir, 'completed', n_partitions)
+        del all_apps, all_completed
+
+        # Merge, eligibility and assignment run together in the worker
+        # processes, so they are timed as one stage
+        with metrics.stage('merge, eligibility and assignment'):
+            df = pd.concat(map_partitions(
+                assign_partition, partition_dir, ['apps', 'completed'],
+                n_partitions, processes,
+                args=(current_session, top_four, todays_date, groups)),
+                ignore_index=True)
+    else:
+        #Merge all and completed applications on the integer email keys (the
+        #addresses of completed apps aren't needed once merged)
+        with metrics.stage('merge'):
+            df = all_apps.merge(
+                all_completed.drop(columns='hashed_email_address'),
+                how = 'left', on = 'email_key')
+        print('Merged in {:.2f} s'.format(metrics.stages['merge']['seconds']))
+
+        # Create a variable indicating current session (with pushdown only
+        # eligible apps are merged, so look at every completed app instead)
+        if pushdown:
+            current_session = all_completed['cohort'].sort_values(
+                ascending=False).iloc[0]
+        else:
+            current_session = df['cohort'].sort_values(
+                ascending = False).iloc[0]
+
+        # Identify applicants to A/B test
+        with metrics.stage('eligibility'):
+            flag_eligible(df, current_session, top_four)
+
+        # Create an empty column to add in random assignment
+        df[todays_date] = np.nan
+
+        # Populate column with random assignment; each applicant's group
+        # comes from a hash of their email and the campaign, so re-running
+        # the job (or running it in batches) gives everyone the same group
+        with metrics.stage('assignment'):
+            df.loc[df['to_nudge'], todays_date] = assign_groups(
+                df.loc[df['to_nudge'], 'hashed_email_address'], todays_date,
+                groups)
+    rows['nudged'] = int(df[todays_date].notna().sum())
+
+    # Store the assignments in the campaign database, one row per applicant
+    if save_to_table:
+        assignments = df.loc[df[todays_date].notna(),
+                             ['hashed_email_address', todays_date]].rename(
+                                 columns={todays_date: 'condition'}).assign(
+                                     campaign_date=pd.to_datetime(
+                                         'today').normalize())
+        with metrics.stage('export table'):
+            write_assignments(assignments, connections.connect('campaign'))
+
+    # Create a csv file with emails randomly assigned to campaigns
+    if save_to_csv:
+        email_list = df.loc[df[todays_date].notna(
+        ), ['hashed_email_address', 'program', todays_date]]
+        email_list.sort_values(todays_date, inplace=True)
+        with metrics.stage('export csv'):
+            email_list.to_csv('email_list_' +
+                              pd.to_datetime('today').strftime("%m-%d-%Y") +
+                              '.csv',
+                              index=False)
+
+    # Report how long each stage took and the peak memory of the job
+    for stage, measures in metrics.report()['stages'].items():
+        print('{:<36}{:>8.2f} s'.format(stage, measures['seconds']))
+    if run_report:
+        metrics.save_report(run_report,
+                            campaign=todays_date,
+                            rows=rows,
+                            extract_seconds=timings,
+                            compacted_bytes=memory)
+
+
+# Worker processes (spawned on macOS, and by default from Python 3.14)
+# import this file again, so the job only runs when it is the script
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import pandas as pd
+
+# Other utilities
+import argparse # For the command line
+import json # For saving and comparing results
+import sys # For the exit status
+from sqlalchemy import create_engine # For the database of synthetic data
+
+# For generating and loading synthetic data
+import synthetic
+
+# The stages of assignment.py
+from extraction import (execute_query, completed_query, completed_columns,
+                        apps_query, apps_columns, timed)
+from cleaning import clean_applications, clean_completed
+from schema import compact
+from eligibility import flag_eligible
+from randomization import assign_groups
+from persistence import read_assignments, write_assignments
+
+# The stages of the dashboard
+from campaigns import from_table, aggregate_campaigns
+from campaign_store import CampaignStore
+from rollup import Rollup
+from daily_counts import DailyCounts
+from figures import counts_payload, lift_summary, cohort_figure
+
+# Programs whose applicants are nudged, as in assignment.py
+top_four = [
+    'Data Science', 'Artificial Intelligence', 'Data Engineering',
+    'Health Data Science'
+]
+
+# A stage counts as a regression when it is this many times slower than the
+# baseline and at least min_seconds slower (so timer noise in stages of a
+# few milliseconds isn't flagged)
+tolerance = 1.25
+min_seconds = 0.05
+
+
+def run(n_applicants, engine, n_campaigns=20, repeat=3):
+    """Load n_applicants of synthetic data into a database and time every
+    stage of assignment.py and of the dashboard's build and callbacks.
+    Each stage runs repeat times and its fastest run is kept. Returns a
+    dictionary of seconds by stage.
+    """
+    timings = {}
+
+    def stage(name, function):
+        runs = {}
+        for i in range(repeat):
+            result = timed(function, i, runs)
+        timings[name] = min(runs.values())
+        return result
+
+    # Load the source tables (once)
+    timed(lambda: synthetic.load(
+        synthetic.generate(n_applicants, n_campaigns=n_campaigns), engine),
+          'load', timings)
+
+    # assignment.py
+    raw_completed = stage(
+        'extract completed',
+        lambda: pd.DataFrame(execute_query(completed_query + ';',
+                                           engine.raw_connection()),
+                             columns=completed_columns))
+    raw_apps = stage(
+        'extract applications',
+        lambda: pd.DataFrame(execute_query(apps_query + ';',
+                                           engine.raw_connection()),
+                             columns=apps_columns))
+    for i in ['application_submission_date']:
+        raw_completed[i] = pd.to_datetime(raw_completed[i])
+    for i in ['created_at', 'updated_at']:
+        raw_apps[i] = pd.to_datetime(raw_apps[i])
+    all_completed = stage(
+        'clean completed',
+        lambda: clean_completed(compact(raw_completed)))
+    all_apps = stage('clean applications',
+                     lambda: compact(clean_applications(raw_apps)))
+    df = stage(
+        'merge', lambda: all_apps.merge(
+            all_completed.drop(columns='hashed_email_address'),
+            how='left', on='email_key'))
+    current_session = df['cohort'].sort_values(ascending=False).iloc[0]
+    stage('flag eligible',
+          lambda: flag_eligible(df, current_session, top_four))
+    campaign = 'campaign_' + pd.to_datetime('today').strftime('%m/%d/%Y')
+    assigned = stage(
+        'assign groups',
+        lambda: assign_groups(df.loc[df['to_nudge'], 'hashed_email_address'],
+                              campaign, synthetic.groups))
+    if engine.dialect.name == 'postgresql':
+        assignments = pd.DataFrame({
+            'hashed_email_address':
+            df.loc[df['to_nudge'], 'hashed_email_address'],
+            'condition': assigned,
+            'campaign_date': pd.to_datetime('today').normalize()
+        })
+        stage('write assignments',
+              lambda: write_assignments(assignments, engine.raw_connection()))
+
+    # The dashboard's build, for the current session
+    assignments = stage('read campaigns',
+                        lambda: compact(from_table(read_assignments(engine))))
+    current = all_completed[all_completed['cohort'] == current_session]
+    session_start = current['application_submission_date'].min().normalize()
+    current_campaigns = assignments[pd.to_datetime(
+        assignments['Campaign'].astype(object),
+        format='%m/%d/%Y') >= session_start]
+    applicants = current[['email_key', 'application_submission_date']].merge(
+        current_campaigns[['email_key']].drop_duplicates(),
+        how='outer',
+        on='email_key')
+    applicants['application_submission_date'] = applicants[
+        'application_submission_date'].dt.floor('d')
+    all_campaigns = stage(
+        'aggregate campaigns',
+        lambda: aggregate_campaigns(applicants, current_campaigns,
+                                    key='email_key'))
+    store = stage('campaign store', lambda: CampaignStore(all_campaigns))
+    history = all_completed[['email_key', 'cohort',
+                             'application_submission_date']].assign(
+                                 application_submission_date=all_completed[
+                                     'application_submission_date'].dt.floor(
+                                         'd'))
+    rollup = stage('rollup', lambda: Rollup.build(history, assignments))
+    stage('daily counts (full)',
+          lambda: DailyCounts().update(engine, from_table(
+              read_assignments(engine))))
+
+    # The dashboard's callbacks, uncached, for the latest campaign
+    latest = store.campaigns()[-1]
+    start_date = pd.to_datetime(latest) - pd.Timedelta(days=3)
+    end_date = store.max_date()
+    stage('figure data', lambda: counts_payload(store, latest))
+    stage('figure data (downsampled)',
+          lambda: counts_payload(store, latest, max_points=30))
+    stage('summary',
+          lambda: lift_summary(store, latest, start_date, end_date))
+    for mode in ['lift', 'weekly']:
+        stage('history ({})'.format(mode),
+              lambda: cohort_figure(rollup, mode))
+    return timings
+
+
+def regressions(results, baseline, tolerance=tolerance,
+                min_seconds=min_seconds):
+    """Return (scale, stage, seconds, baseline seconds) for every stage
+    slower than tolerance times its baseline (and by at least min_seconds).
+    """
+    slower = []
+    for scale, timings in results.items():
+        for stage, seconds in timings.items():
+            before = baseline.get(scale, {}).get(stage)
+            if (before and seconds > before * tolerance and
+                    seconds - before > min_seconds):
+                slower.append((scale, stage, seconds, before))
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Time assignment.py and the dashboard on synthetic data.')
+    parser.add_argument('--applicants', type=int, nargs='+',
+                        default=[10000, 100000])
+    parser.add_argument('--campaigns', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database', default='sqlite:///benchmark.db',
+                        help='SQLAlchemy URL of a scratch database')
+    parser.add_argument('--output', help='Save the results as JSON')
+    parser.add_argument('--baseline',
+                        help='Compare with results saved by --output')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database)
+    results = {}
+    for n in args.applicants:
+        results[str(n)] = run(n, engine, n_campaigns=args.campaigns,
+                              repeat=args.repeat)
+        print('{:,} applicants'.format(n))
+        for stage, seconds in results[str(n)].items():
+            print('  {:<24}{:>10.3f} s'.format(stage, seconds))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f))
+        for scale, stage, seconds, before in slower:
+            print('Regression at {} applicants: {} took {:.3f} s '
+                  '(baseline {:.3f} s)'.format(scale, stage, seconds,
+                                               before))
+        sys.exit(1 if slower else 0)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For analyses
+import numpy as np
+import pandas as pd
+
+# For running campaigns in parallel
+from concurrent.futures import ProcessPoolExecutor
+
+# Number of bootstrap resamples and width of the confidence intervals
+resamples = 10000
+confidence = 0.95
+
+
+def lift_intervals(totals, sizes, control_totals, control_sizes,
+                   resamples=resamples, confidence=confidence, seed=0):
+    """Bootstrap confidence intervals for the lift of treatments over controls.
+    Each argument is an array with one entry per treatment: submissions and
+    applicants in the treatment and in its control. Every resample of every
+    treatment and control is drawn in one binomial array operation. Lift is
+    (treatment rate - control rate) / control rate, as on the dashboard.
+    Returns the lower and upper bounds as arrays, in percent.
+    """
+    n_treatments = len(totals)
+    if n_treatments == 0:
+        return np.array([]), np.array([])
+    sizes = np.concatenate([sizes, control_sizes]).astype(np.int64)
+    rates = np.concatenate([totals, control_totals]).astype(
+        np.float64) / np.maximum(sizes, 1)
+
+    # Submissions in every resample, as rates
+    rng = np.random.default_rng(seed)
+    draws = rng.binomial(sizes[:, None],
+                         np.clip(rates, 0, 1)[:, None],
+                         size=(len(sizes), resamples))
+    draws = draws / np.maximum(sizes, 1)[:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lift = (draws[:n_treatments] -
+                draws[n_treatments:]) / draws[n_treatments:]
+
+    # Lift is undefined for resamples where no one in the control submitted
+    lift[~np.isfinite(lift)] = np.nan
+    alpha = (1 - confidence) / 2
+    lower, upper = np.nanpercentile(lift, [100 * alpha, 100 * (1 - alpha)],
+                                    axis=1)
+    return lower * 100, upper * 100
+
+
+def _intervals(rows, resamples, confidence, seed):
+    lower, upper = lift_intervals(rows['Total'], rows['Size'],
+                                  rows['Control Total'], rows['Control Size'],
+                                  resamples=resamples,
+                                  confidence=confidence,
+                                  seed=seed)
+    return rows.assign(Lower=lower, Upper=upper)
+
+
+def campaign_intervals(store, start_date, end_date, campaigns=None,
+                       resamples=resamples, confidence=confidence, seed=0,
+                       processes=None):
+    """Lift confidence intervals for every treatment of every campaign.
+    Submissions and sizes come from a CampaignStore over the dates given.
+    With processes, campaigns are split across a process pool. Returns a
+    DataFrame with Campaign, Condition, Lift, Lower and Upper (percent).
+    """
+    if campaigns is None:
+        campaigns = store.campaigns()
+
+    # One row per treatment with its control's submissions and size
+    rows = []
+    for campaign in campaigns:
+        conditions = store.conditions(campaign)
+        if 'Control' not in conditions:
+            continue
+        control_total = store.total(campaign, 'Control', start_date, end_date)
+        control_size = store.size(campaign, 'Control')
+        for i in conditions:
+            if (i != 'None') & (i != 'Control'):
+                rows.append({
+                    'Campaign': campaign,
+                    'Condition': i,
+                    'Total': store.total(campaign, i, start_date, end_date),
+                    'Size': store.size(campaign, i),
+                    'Control Total': control_total,
+                    'Control Size': control_size
+                })
+    rows = pd.DataFrame(rows, columns=[
+        'Campaign', 'Condition', 'Total', 'Size', 'Control Total',
+        'Control Size'
+    ])
+
+    if processes and len(campaigns) > 1:
+        # One chunk of campaigns per process, each with its own random stream
+        chunks = np.array_split(pd.unique(rows['Campaign']), processes)
+        chunks = [rows[rows['Campaign'].isin(i)] for i in chunks if len(i)]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(
+                executor.map(_intervals, chunks, [resamples] * len(chunks),
+                             [confidence] * len(chunks), seeds))
+        rows = pd.concat(results)
+    else:
+        rows = _intervals(rows, resamples, confidence, seed)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows['Lift'] = ((rows['Total'] / rows['Size']) /
+                        (rows['Control Total'] / rows['Control Size']) -
+                        1) * 100
+    rows = rows[['Campaign', 'Condition', 'Lift', 'Lower', 'Upper']]
+    return rows.reset_index(drop=True)
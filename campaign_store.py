@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Columns of the aggregated campaign data
+store_columns = ['Campaign', 'Condition', 'Date', 'Counts', 'Size']
+
+
+class CampaignStore:
+    """Aggregated campaign data partitioned once by campaign and condition.
+    The columns are kept as NumPy arrays sorted by campaign, condition and
+    date, so each partition is a contiguous slice (a view, not a copy) and a
+    range of dates is found with a binary search instead of scanning every
+    campaign's rows. Cumulative counts are kept for every partition, so the
+    number of submissions over any range of dates is the difference of two
+    array lookups. all_campaigns is a DataFrame or a dictionary of arrays
+    already in that order (such as a memory-mapped snapshot).
+    """
+    def __init__(self, all_campaigns):
+        if isinstance(all_campaigns, pd.DataFrame):
+            all_campaigns = all_campaigns.sort_values(
+                ['Campaign', 'Condition', 'Date'], kind='mergesort')
+        self.columns = {i: np.asarray(all_campaigns[i]) for i in store_columns}
+
+        # Positions where the campaign or condition changes
+        campaign = self.columns['Campaign']
+        condition = self.columns['Condition']
+        changes = np.flatnonzero((campaign[1:] != campaign[:-1]) |
+                                 (condition[1:] != condition[:-1])) + 1
+        starts = np.concatenate([[0], changes]) if len(campaign) else []
+        ends = np.concatenate([changes, [len(campaign)]])
+
+        self.dates = {}
+        self.counts = {}
+        self.cumulative = {}
+        self.sizes = {}
+        self.condition_lists = {}
+        for start, end in zip(starts, ends):
+            key = str(campaign[start]), str(condition[start])
+            self.dates[key] = self.columns['Date'][start:end]
+            self.counts[key] = self.columns['Counts'][start:end]
+            self.cumulative[key] = np.concatenate(
+                [[0], np.cumsum(self.counts[key])])
+            self.sizes[key] = self.columns['Size'][start]
+            self.condition_lists.setdefault(key[0], []).append(key[1])
+
+    def campaigns(self):
+        """Return the campaigns in order."""
+        return list(self.condition_lists)
+
+    def conditions(self, campaign):
+        """Return a campaign's conditions in order."""
+        return self.condition_lists[campaign]
+
+    def max_date(self):
+        """Return the last day with data."""
+        return pd.Timestamp(self.columns['Date'].max())
+
+    def bounds(self, campaign, condition, start_date, end_date):
+        """Return the positions of the first day on or after start_date and
+        just past the last day on or before end_date.
+        """
+        dates = self.dates[campaign, condition]
+        start = np.searchsorted(dates,
+                                np.datetime64(pd.to_datetime(start_date)),
+                                side='left')
+        end = np.searchsorted(dates,
+                              np.datetime64(pd.to_datetime(end_date)),
+                              side='right')
+        return start, max(start, end)
+
+    def window(self, campaign, condition, start_date, end_date):
+        """Return the days and counts of one campaign and condition between
+        start_date and end_date, inclusive, as views of the stored arrays.
+        """
+        start, end = self.bounds(campaign, condition, start_date, end_date)
+        return (self.dates[campaign, condition][start:end],
+                self.counts[campaign, condition][start:end])
+
+    def total(self, campaign, condition, start_date, end_date):
+        """Return the submissions of one campaign and condition between
+        start_date and end_date, inclusive.
+        """
+        start, end = self.bounds(campaign, condition, start_date, end_date)
+        cumulative = self.cumulative[campaign, condition]
+        return cumulative[end] - cumulative[start]
+
+    def size(self, campaign, condition):
+        """Return the number of applicants in a campaign's condition."""
+        return self.sizes[campaign, condition]
+
+    def study_size(self, campaign, start_date, end_date):
+        """Return the number of applicants in the study (every condition but
+        'None' with days between start_date and end_date).
+        """
+        sizes = []
+        for i in self.conditions(campaign):
+            start, end = self.bounds(campaign, i, start_date, end_date)
+            if i != 'None' and end > start:
+                sizes.append(self.sizes[campaign, i])
+        return np.unique(sizes).sum()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Columns of the aggregated campaign data shown on the dashboard
+campaign_columns = ['Date', 'Condition', 'Counts', 'Campaign', 'Size']
+
+
+def to_long(df_wide):
+    """Turn one campaign_MM/DD/YYYY column per campaign into one row per
+    row and campaign, with hashed_email_address, Campaign (MM/DD/YYYY) and
+    Condition columns. Applicants without a condition are kept under the
+    'None' condition, as the wide layout counts them.
+    """
+    campaign_names = df_wide.filter(regex='campaign', axis=1).columns.tolist()
+    assignments = df_wide.melt(id_vars='hashed_email_address',
+                               value_vars=campaign_names,
+                               var_name='Campaign',
+                               value_name='Condition')
+    assignments['Condition'] = assignments['Condition'].fillna('None')
+    assignments['Campaign'] = assignments['Campaign'].str.extract(
+        'campaign_(.*)', expand=False)
+    return assignments.reset_index(drop=True)
+
+
+def from_table(assignments):
+    """Rename assignments read from the campaign table to the long layout."""
+    return pd.DataFrame({
+        'hashed_email_address': assignments['hashed_email_address'],
+        'Campaign': pd.to_datetime(
+            assignments['campaign_date']).dt.strftime('%m/%d/%Y'),
+        'Condition': assignments['condition']
+    })
+
+
+def aggregate_campaigns(applicants, assignments,
+                        key='hashed_email_address'):
+    """Count submissions per campaign, condition and day in one aggregation.
+    applicants has one row per applicant (hashed_email_address and
+    application_submission_date, rounded to the day; applicants who haven't
+    submitted have no date) and assignments one row per applicant and
+    campaign (Condition 'None' for applicants left out of it). Applicants
+    without a row for a campaign are counted under its 'None' condition.
+    Every campaign gets every day between the first and last submission,
+    with missing days counted as 0, and Size is the number of rows in each
+    condition (an applicant listed twice counts twice, in Size and Counts,
+    as in the wide layout). Applicants are matched on key (such as the
+    integer email_key of schema.compact); Campaign and Condition may be
+    categoricals.
+    """
+    dates = applicants['application_submission_date']
+    application_range = pd.date_range(dates.min(), dates.max())
+    total_size = len(applicants)
+
+    # Submissions per day over all applicants
+    total_counts = dates.value_counts().reindex(application_range,
+                                                fill_value=0).to_numpy()
+
+    # Attach submission dates to the assignments
+    assigned = assignments[[key, 'Campaign', 'Condition']].merge(
+        applicants[[key, 'application_submission_date']],
+        how='left',
+        on=key)
+
+    # Sizes and daily counts of the listed conditions (only the
+    # combinations that occur, when grouping categoricals)
+    sizes = assigned.groupby(['Campaign', 'Condition'], observed=True).size()
+    counts = assigned.groupby(
+        ['Campaign', 'Condition', 'application_submission_date'],
+        observed=True).size()
+
+    # Applicants listed at least once per campaign, and their submissions
+    listed = assigned[assigned[key].isin(applicants[key])].drop_duplicates(
+        [key, 'Campaign'])
+    listed_sizes = listed.groupby('Campaign', observed=True).size()
+    listed_counts = listed.groupby(
+        ['Campaign', 'application_submission_date'], observed=True).size()
+
+    # Plain labels from here on, so 'None' can be added as a condition
+    for i in sizes, counts, listed_counts:
+        i.index = i.index.set_levels(
+            [j.astype(object) if isinstance(j, pd.CategoricalIndex) else j
+             for j in i.index.levels])
+    listed_sizes.index = listed_sizes.index.astype(object)
+
+    # Dense grids of listed (campaign, condition) and campaign by day
+    n_days = len(application_range)
+    grid = counts.reindex(pd.MultiIndex.from_arrays([
+        np.repeat(sizes.index.get_level_values('Campaign'), n_days),
+        np.repeat(sizes.index.get_level_values('Condition'), n_days),
+        np.tile(application_range, len(sizes))
+    ]), fill_value=0).to_numpy().reshape(len(sizes), n_days)
+    campaigns = pd.Index(sizes.index.get_level_values('Campaign').unique(
+    )).sort_values()
+    listed_grid = listed_counts.reindex(pd.MultiIndex.from_arrays([
+        np.repeat(campaigns, n_days),
+        np.tile(application_range, len(campaigns))
+    ]), fill_value=0).to_numpy().reshape(len(campaigns), n_days)
+    return campaign_frame(
+        sizes, grid, total_counts, total_size, application_range,
+        listed=(listed_sizes.reindex(campaigns, fill_value=0).to_numpy(),
+                listed_grid))
+
+
+def campaign_frame(sizes, grid, total_counts, total_size, application_range,
+                   listed):
+    """Build the aggregated campaign data from the listed conditions.
+    sizes is a Series of rows per Campaign and Condition (a sorted
+    MultiIndex) and grid their submissions, one row per entry of sizes and
+    one column per day of application_range. total_counts holds the daily
+    submissions and total_size the number of all applicants. listed is the
+    number of distinct applicants listed per campaign (campaigns in sorted
+    order) and their daily submissions; everyone else is added to the
+    campaign's 'None' condition.
+    """
+    n_days = len(application_range)
+    campaigns = pd.Index(
+        sizes.index.get_level_values('Campaign').unique()).sort_values()
+    listed_sizes, listed_grid = listed
+
+    # Everyone not listed for a campaign is in its 'None' condition, along
+    # with anyone listed under 'None'
+    none_index = pd.MultiIndex.from_arrays(
+        [campaigns, ['None'] * len(campaigns)],
+        names=['Campaign', 'Condition'])
+    all_sizes = pd.concat([
+        sizes, pd.Series(total_size - np.asarray(listed_sizes),
+                         index=none_index)
+    ])
+    all_grid = np.concatenate([grid, total_counts - listed_grid])
+    all_index = all_sizes.index.unique().sort_values()
+    rows = all_index.get_indexer(all_sizes.index)
+    summed_sizes = np.zeros(len(all_index), dtype=np.int64)
+    np.add.at(summed_sizes, rows, all_sizes.to_numpy())
+    summed_grid = np.zeros((len(all_index), n_days), dtype=np.int64)
+    np.add.at(summed_grid, rows, all_grid)
+    keep = summed_sizes > 0
+    all_index = all_index[keep]
+    summed_sizes = summed_sizes[keep]
+    summed_grid = summed_grid[keep]
+
+    # One row per day, campaign and condition, ordered by campaign and date
+    all_campaigns = pd.DataFrame({
+        'Date': np.tile(application_range, len(all_index)),
+        'Condition': np.repeat(all_index.get_level_values('Condition'),
+                               n_days),
+        'Counts': summed_grid.ravel(),
+        'Campaign': np.repeat(all_index.get_level_values('Campaign'), n_days),
+        'Size': np.repeat(summed_sizes, n_days)
+    })
+    all_campaigns.sort_values(['Campaign', 'Date', 'Condition'],
+                              kind='mergesort',
+                              inplace=True)
+    return all_campaigns.reset_index(drop=True)[campaign_columns]
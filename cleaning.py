@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# For scoring gibberish responses
+import gibberish
+
+# For timing the cleaning
+from instrumentation import metrics
+
+# Accounts created before 4/19/19 at 7:30 were used for testing
+start_date = pd.to_datetime('2019-04-19 07:30:00.0')
+
+# Free-text questions used to detect gibberish responses
+writing_questions = [
+    'ai_motivation', 'ai_tools', 'coursework', 'dc_education', 'dc_innovation',
+    'dc_motivation', 'de_motivation', 'debugging', 'dev_ops_motivation',
+    'ds_motivation', 'largest_codebase', 'largest_team', 'ml_innovation',
+    'ml_problem', 'networking', 'sec_motivation', 'sec_tradeoffs',
+    'side_projects', 'statistical_methods', 'technical_tradeoffs', 'tools'
+]
+
+# Columns kept once the applications are cleaned
+app_columns = ['hashed_email_address', 'program', 'updated_at']
+
+
+@metrics.stage('clean applications')
+def clean_applications(all_apps):
+    """Clean a frame (or a chunk) of unfinished applications.
+    Every step works row by row, so cleaning chunks one at a time and
+    concatenating them gives the same result as cleaning the full table.
+    """
+    # Replace empty strings with NaN
+    all_apps = all_apps.replace("", np.nan)
+
+    # Do some basic cleaning; delete accounts before the start date (testing)
+    all_apps = all_apps[all_apps['created_at'] > start_date]
+
+    with metrics.stage('gibberish filter'):
+        # Use cutoff of five responses without spaces
+        keep_applications = gibberish.keep_applications(all_apps,
+                                                        writing_questions)
+
+        # Remove data without any spaces in 5 or more columns, as gibberish
+        # responses typically don't have any spaces
+        all_apps = all_apps[keep_applications]
+
+    #Subset only relevant columns
+    return all_apps[app_columns]
+
+
+@metrics.stage('clean completed')
+def clean_completed(all_completed):
+    """Clean the finished applications.
+    Parses submission dates, keeps the latest application per applicant
+    and adds the cohort (year and session). Expects the email_key column
+    added by schema.compact.
+    """
+    # Change data to datetype format in completed app dataset
+    all_completed['application_submission_date'] = pd.to_datetime(
+        all_completed['application_submission_date'],
+        infer_datetime_format=True).dt.tz_localize(None)
+
+    # Drop duplicates from completed file
+    all_completed.sort_values(by='application_submission_date',
+                              ascending=False,
+                              inplace=True)
+    all_completed.drop_duplicates('email_key', inplace=True)
+
+    # Create a feature indicating cohort
+    all_completed['cohort'] = all_completed['year'].astype(str).str.cat(
+        all_completed['session']).astype('category')
+    return all_completed
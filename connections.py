@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Other utilities
+import queue # For idle connections
+import threading # For bounding and guarding the pools
+import time # For recycling old connections
+import psycopg2 # For querying databases
+
+#For querying and creating databases
+from sqlalchemy import create_engine
+
+# Settings shared by every pool: the most connections open per source, how
+# many seconds a connection is reused for, whether to check a connection
+# before handing it out, and how long to wait for a free connection
+max_connections = 4
+recycle = 3600
+pre_ping = True
+timeout = 30
+
+# Credentials, pools and engines already created, by source
+_credentials = {}
+_pools = {}
+_engines = {}
+_lock = threading.Lock()
+
+
+def read_credentials(source):
+    """Read credentials_<source>.txt once and return them as a dictionary.
+    The file lists the database, user, password, host and port on separate
+    lines; host and port may be left out for a local database.
+    """
+    with _lock:
+        if source not in _credentials:
+            lines = [
+                i.strip()
+                for i in open('credentials_%s.txt' % source).readlines()
+            ]
+            lines += ['localhost', '5432'][len(lines) - 3:]
+            _credentials[source] = dict(
+                zip(['database', 'user', 'password', 'host', 'port'],
+                    lines[:5]))
+        return _credentials[source]
+
+
+class PooledConnection:
+    """A psycopg2 connection borrowed from a ConnectionPool.
+    Behaves like the connection it wraps, except that close() hands it back
+    to the pool, so execute_query and stream_query work unchanged.
+    """
+    def __init__(self, pool, connection, created):
+        self._pool = pool
+        self._connection = connection
+        self._created = created
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._connection is not None:
+            self._pool._release(self._connection, self._created)
+            self._connection = None
+
+
+class ConnectionPool:
+    """A bounded pool of psycopg2 connections to one database.
+    Idle connections are checked before reuse (if pre_ping) and replaced
+    once they are older than recycle seconds.
+    """
+    def __init__(self, credentials, max_connections=max_connections,
+                 recycle=recycle, pre_ping=pre_ping, timeout=timeout):
+        self.credentials = credentials
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _healthy(self, connection, created):
+        if connection.closed or time.time() - created > self.recycle:
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            cur = connection.cursor()
+            cur.execute('SELECT 1;')
+            cur.close()
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def connect(self):
+        """Borrow a connection; close() it to give it back."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(
+                'No free connection to %s after %s seconds' %
+                (self.credentials['database'], self.timeout))
+        try:
+            while True:
+                try:
+                    connection, created = self._idle.get_nowait()
+                except queue.Empty:
+                    connection = psycopg2.connect(**self.credentials)
+                    created = time.time()
+                    break
+                if self._healthy(connection, created):
+                    break
+                connection.close()
+        except BaseException:
+            self._slots.release()
+            raise
+        return PooledConnection(self, connection, created)
+
+    def _release(self, connection, created):
+        # End any open transaction so the connection goes back idle
+        try:
+            if not connection.closed:
+                connection.rollback()
+                self._idle.put((connection, created))
+        except psycopg2.Error:
+            connection.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                connection, created = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            connection.close()
+
+
+def get_pool(source):
+    """Return the connection pool for a source, creating it on first use."""
+    credentials = read_credentials(source)
+    with _lock:
+        if source not in _pools:
+            _pools[source] = ConnectionPool(credentials)
+        return _pools[source]
+
+
+def connect(source):
+    """Borrow a connection to a source ('greenhouse', 'heroku', 'campaign')."""
+    return get_pool(source).connect()
+
+
+def get_engine(source):
+    """Return a pooled SQLAlchemy engine for a source, for use with pandas.
+    The engine is created once and reused across queries and refreshes.
+    """
+    credentials = read_credentials(source)
+    with _lock:
+        if source not in _engines:
+            _engines[source] = create_engine(
+                'postgresql://%s:%s@%s:%s/%s' %
+                (credentials['user'], credentials['password'],
+                 credentials['host'], credentials['port'],
+                 credentials['database']),
+                pool_size=max_connections,
+                max_overflow=0,
+                pool_timeout=timeout,
+                pool_recycle=recycle,
+                pool_pre_ping=pre_ping)
+        return _engines[source]
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+import os # For saving the counts
+import pickle # For saving the counts
+from sqlalchemy import text # For queries that run on Postgres and SQLite
+
+# For email keys and the aggregated campaign data
+from schema import compact, email_keys
+from campaigns import campaign_frame, campaign_columns
+
+# Finished applications, all of them or those submitted after the watermark
+submissions_query = """
+SELECT hashed_email_address, year, session, application_submission_date
+FROM completed_apps
+"""
+
+new_submissions_query = submissions_query + """
+WHERE application_submission_date >= :watermark
+"""
+
+
+class DailyCounts:
+    """Daily submissions per campaign and condition, kept up to date by
+    folding in only the submissions made since the last update.
+    Holds the day each applicant of the current session last submitted, the
+    assignments, and a dense grid of counts per assigned (campaign,
+    condition) and day, plus daily counts over all applicants. Each update
+    queries completed_apps for rows at or after the watermark (the latest
+    application_submission_date seen), skips the rows on the watermark that
+    were already folded in, moves re-submitting applicants to their new day
+    and adds new ones, widening the grid when new days appear. When the
+    assignments change (a new campaign), the grid is rebuilt from the stored
+    days without querying the database; only a new session rebuilds the
+    counts from scratch. engine is any SQLAlchemy engine holding
+    completed_apps, so SQLite can stand in for Postgres.
+    """
+    def __init__(self):
+        self.watermark = None
+        self.boundary = pd.DataFrame({'email_key': [], 'date': []})
+        self.session = None
+        self.session_start = None
+        self.fingerprint = None
+        self.days = pd.Series(dtype='datetime64[ns]')
+        self.groups = None
+        self.members = None
+        self.start = None
+        self.grid = None
+        self.total_counts = None
+
+    @classmethod
+    def load(cls, path):
+        """Load saved counts, or return empty counts if there are none."""
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return cls()
+
+    def save(self, path):
+        """Save the counts, replacing the file in one step."""
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(path + '.tmp', path)
+
+    def _submissions(self, engine):
+        if self.watermark is None:
+            rows = pd.read_sql_query(text(submissions_query), engine)
+        else:
+            rows = pd.read_sql_query(
+                text(new_submissions_query),
+                engine,
+                params={'watermark': self.watermark.to_pydatetime()})
+        dates = pd.to_datetime(rows['application_submission_date'],
+                               infer_datetime_format=True)
+        rows = pd.DataFrame({
+            'email_key': email_keys(rows['hashed_email_address']),
+            'date': dates.dt.tz_localize(None),
+            'cohort': rows['year'].astype(str).str.cat(rows['session'])
+        })
+
+        # Rows on the watermark were folded in by the last update
+        seen = pd.MultiIndex.from_frame(rows[['email_key', 'date']]).isin(
+            pd.MultiIndex.from_frame(self.boundary))
+        rows = rows[~seen]
+        dates = dates[~seen]
+
+        # Move the watermark to the latest submission, remembering the rows
+        # on it
+        if dates.notna().any():
+            latest = dates.max()
+            boundary = rows.loc[dates == latest, ['email_key', 'date']]
+            if latest == self.watermark:
+                boundary = pd.concat([self.boundary, boundary],
+                                     ignore_index=True)
+            self.watermark = latest
+            self.boundary = boundary.reset_index(drop=True)
+
+        # Latest submission per applicant, rounded to the day
+        rows.sort_values('date', ascending=False, inplace=True)
+        rows.drop_duplicates('email_key', inplace=True)
+        rows['day'] = rows['date'].dt.floor('d')
+        return rows
+
+    def _columns(self, days):
+        return ((days - self.start) // pd.Timedelta(days=1)).to_numpy()
+
+    def _widen(self, days):
+        # Add columns to the grid so it covers every day given
+        first, last = days.min(), days.max()
+        if self.start is None:
+            self.start = first
+            n_days = (last - first).days + 1
+            self.grid = np.zeros((len(self.groups), n_days), dtype=np.int64)
+            self.total_counts = np.zeros(n_days, dtype=np.int64)
+            return
+        before = max((self.start - first).days, 0)
+        after = max((last - self.start).days + 1 - len(self.total_counts), 0)
+        if before or after:
+            self.grid = np.pad(self.grid, ((0, 0), (before, after)))
+            self.total_counts = np.pad(self.total_counts, (before, after))
+            self.start = min(self.start, first)
+
+    def _add(self, days, sign):
+        # Add (or with sign -1 remove) submissions of applicants on days
+        if len(days) == 0:
+            return
+        if sign > 0:
+            self._widen(days)
+        columns = self._columns(days)
+        np.add.at(self.total_counts, columns, sign)
+        members = self.members.merge(
+            pd.DataFrame({'email_key': days.index.to_numpy(),
+                          'column': columns}),
+            on='email_key')
+        np.add.at(self.grid, (members['group'].to_numpy(),
+                              members['column'].to_numpy()), sign)
+
+    def _rebuild(self, engine, assignments):
+        self.__init__()
+        rows = self._submissions(engine)
+        if len(rows):
+            self.session = rows['cohort'].sort_values(
+                ascending=False).iloc[0]
+            rows = rows[(rows['cohort'] == self.session) &
+                        rows['day'].notna()]
+            self.session_start = rows['day'].min()
+        self.days = pd.Series(rows['day'].to_numpy(),
+                              index=rows['email_key'].to_numpy())
+        self._reassign(assignments)
+
+    def _reassign(self, assignments):
+        # Regroup the stored days under new assignments, with no query
+        self._assign(assignments)
+        self.start = None
+        self.grid = None
+        self.total_counts = None
+        self._add(self.days, 1)
+
+    def _assign(self, assignments):
+        # Keep the campaigns started since the session opened, one group
+        # per (campaign, condition) in sorted order
+        self.fingerprint = self._fingerprint(assignments)
+        assignments = self._session_assignments(assignments)
+        grouped = pd.DataFrame({
+            'Campaign': assignments['Campaign'].astype(object),
+            'Condition': assignments['Condition'].astype(object)
+        }).groupby(['Campaign', 'Condition'])
+        group = grouped.ngroup().to_numpy()
+        self.groups = grouped.size().index
+        self.members = pd.DataFrame({
+            'email_key': assignments['email_key'].to_numpy(),
+            'group': group
+        })
+
+    def _session_assignments(self, assignments):
+        if self.session_start is None:
+            return assignments.iloc[:0]
+        campaign_dates = pd.to_datetime(assignments['Campaign'].astype(object),
+                                        format='%m/%d/%Y')
+        return assignments[campaign_dates >= self.session_start.normalize()]
+
+    @staticmethod
+    def _fingerprint(assignments):
+        return int(pd.util.hash_pandas_object(
+            assignments[['email_key', 'Campaign', 'Condition']].astype(
+                {'Campaign': object, 'Condition': object}),
+            index=False).sum())
+
+    def update(self, engine, assignments):
+        """Fold new submissions into the counts and return the aggregated
+        campaign data (as campaigns.aggregate_campaigns would).
+        assignments has one row per assignment with hashed_email_address,
+        Campaign (MM/DD/YYYY) and Condition; campaigns started before the
+        current session are left out.
+        """
+        assignments = compact(assignments)
+        if self.watermark is None:
+            self._rebuild(engine, assignments)
+            return self.to_frame()
+
+        rows = self._submissions(engine)
+        if (rows['cohort'] > self.session).any():
+            # A new session has started
+            self._rebuild(engine, assignments)
+            return self.to_frame()
+
+        if self._fingerprint(assignments) != self.fingerprint:
+            # New or changed campaigns; the submissions are already here
+            self._reassign(assignments)
+
+        # Applicants submitting again move to their new day
+        again = self.days.index.isin(rows['email_key'])
+        self._add(self.days[again], -1)
+        self.days = self.days[~again]
+
+        rows = rows[(rows['cohort'] == self.session) & rows['day'].notna()]
+        days = pd.Series(rows['day'].to_numpy(),
+                         index=rows['email_key'].to_numpy())
+        self._add(days, 1)
+        self.days = pd.concat([self.days, days])
+        return self.to_frame()
+
+    def to_frame(self):
+        """Return the aggregated campaign data from the counts (an empty
+        frame before the first submission).
+        """
+        if self.total_counts is None or not self.total_counts.any():
+            return pd.DataFrame(columns=campaign_columns)
+
+        # Days from the first to the last submission
+        submitted = np.flatnonzero(self.total_counts)
+        first, last = submitted[0], submitted[-1] + 1
+        application_range = pd.date_range(
+            self.start + pd.Timedelta(days=int(first)),
+            periods=last - first)
+
+        # Every applicant who submitted or was assigned
+        total_size = len(self.days.index.union(
+            pd.Index(self.members['email_key'].unique())))
+        sizes = pd.Series(np.bincount(self.members['group'],
+                                      minlength=len(self.groups)),
+                          index=self.groups)
+
+        # Distinct applicants assigned per campaign and their submissions,
+        # so an applicant listed twice in a campaign leaves it only once
+        campaigns = pd.Index(
+            self.groups.get_level_values('Campaign').unique()).sort_values()
+        listed = pd.DataFrame({
+            'email_key': self.members['email_key'].to_numpy(),
+            'campaign': campaigns.get_indexer(self.groups.get_level_values(
+                'Campaign'))[self.members['group'].to_numpy()]
+        }).drop_duplicates()
+        listed_sizes = np.bincount(listed['campaign'],
+                                   minlength=len(campaigns))
+        listed_grid = np.zeros((len(campaigns), len(self.total_counts)),
+                               dtype=np.int64)
+        submitted = listed.merge(pd.DataFrame({
+            'email_key': self.days.index.to_numpy(),
+            'column': self._columns(self.days)
+        }), on='email_key')
+        np.add.at(listed_grid, (submitted['campaign'].to_numpy(),
+                                submitted['column'].to_numpy()), 1)
+        return campaign_frame(sizes, self.grid[:, first:last],
+                              self.total_counts[first:last], total_size,
+                              application_range,
+                              listed=(listed_sizes,
+                                      listed_grid[:, first:last]))
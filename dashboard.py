@@ -5,33 +5,39 @@
 import numpy as np
 import pandas as pd
 import datetime as dt # For managing datetime objects
-import random # For random draws
-import re # For regular expressions 
+import hmac # For comparing refresh tokens
+from functools import lru_cache # For caching callback results
 
 # For dash plots
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-import plotly.graph_objects as go
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, ClientsideFunction
 
-# For fishers exact test
-from scipy import stats
+# For the figures and lift summaries
+from figures import counts_payload, lift_summary, cohort_figure
 
 #For querying and creating databases
-from sqlalchemy import create_engine
+from connections import connect, get_engine
+from extract_cache import cached_query
+from persistence import read_assignments
 
-# Read in postgres credentials
-greenhouse = open('credentials_greenhouse.txt').readlines()
-database = greenhouse[0].strip()
-username = greenhouse[1].strip()
-password = greenhouse[2].strip()
-host = greenhouse[3].strip()
-port = greenhouse[4].strip()
+# For aggregating campaigns
+from campaigns import to_long, from_table, aggregate_campaigns
+from schema import compact
+from daily_counts import DailyCounts
+from rollup import Rollup
 
-# Create a connection to database using postgreSQL
-engine = create_engine('postgresql://%s:%s@%s:%s/%s' %
-                       (username, password, host, port, database))
+# For rebuilding the data without restarting the server
+from refresh import SnapshotRefresher
+from shared_snapshot import SharedSnapshot
+
+# For timing the build and callbacks
+from flask import Response, request
+from instrumentation import metrics
+
+# For serving the aggregates to other tools
+from api import aggregates_api, cached_response, snapshot_etag
 
 # Query to extract data
 sql_query = """
@@ -39,308 +45,406 @@ SELECT hashed_email_address, year, session, application_submission_date
 FROM completed_apps;
 """
 
-# Extract relevant columns
-all_completed = pd.read_sql_query(sql_query, engine)
-
-# Change data to datetype format in completed app dataset
-all_completed['application_submission_date'] = pd.to_datetime(
-    all_completed['application_submission_date'],
-    infer_datetime_format=True).dt.tz_localize(None)
-
-# Drop duplicates from completed file
-all_completed.sort_values(by='application_submission_date',
-                          ascending=False,
-                          inplace=True)
-all_completed.drop_duplicates('hashed_email_address', inplace=True)
-
-# Create a feature indicating cohort
-all_completed['cohort'] = all_completed['year'].astype(str).str.cat(
-    all_completed['session'])
-
-# Create a variable indicating current session
-current_session = all_completed['cohort'].sort_values(
-    ascending=False).iloc[0]  #Current session
-
-# Choose only data from current sesion
-all_completed = all_completed[all_completed['cohort'] == current_session]
+# Set to True to read assignments from the campaign database; the demo reads
+# simulated assignments from a csv file
+use_campaign_table = False
 
-# # Read in postgres credentials
-# campaign_info = open('credentials_campaign.txt').readlines()
-# database = campaign_info[0].strip()
-# username = campaign_info[1].strip()
-# password = campaign_info[2].strip()
+# With the campaign table, set to True to keep daily counts on disk and fold
+# in only the submissions made since the last build (no demo data is added)
+incremental_counts = False
+counts_path = 'daily_counts.pkl'
 
-# # Create a connection to database using postgreSQL
-# engine = create_engine('postgresql://%s:%s@localhost/%s' %
-#                        (username, password, database))
+# Set to True to also aggregate the campaigns of every past cohort into a
+# rollup for the historical view (with the campaign table, every campaign is
+# read instead of only those of the current session)
+historical = True
 
-# # Read in the existing SQL database
-# # Contains information about any campaigns started
-# df_campaign = pd.read_sql_table('campaign_table', con=engine).drop('index',
-#                                                                    axis=1)
+# Seconds between rebuilds of the data in the background (None to rebuild
+# only on demand)
+refresh_interval = 24 * 60 * 60
 
-# # Change none to NaN
-# df_campaign.fillna(value = np.nan, inplace = True)
+# Rebuilds on demand (POST /refresh) need the token on the first line of
+# credentials_refresh.txt in an X-Refresh-Token header (no file, no
+# rebuilds on demand), and are refused within this many seconds of the last
+# build
+refresh_token_file = 'credentials_refresh.txt'
+min_refresh_age = 10 * 60
 
-# Read in the campaign data from a csv file
-df_campaign = pd.read_csv('simulated_data.csv')
+# The data are built once into a directory of memory-mapped column files that
+# every gunicorn worker shares; workers look for a newer build this often
+snapshot_dir = 'dashboard_snapshot'
+check_interval = 60
 
-# Merge datasets
-df_dash = all_completed.merge(df_campaign, 
-                              how = 'outer', 
-                              on = 'hashed_email_address')
+# The campaign figure is drawn in the browser from each campaign's daily
+# counts; set to a number of points to sum longer spans into bins of several
+# days before sending them (None to always send every day). Binned counts
+# are sent again whenever the dates change.
+max_points = None
 
-# Change condition names
-df_dash.loc[df_dash['campaign_06/15/2020'] ==
-            'C', 'campaign_06/15/2020'] = 'Control'
 
 # Function to generate fake data for demo
-start = pd.to_datetime('06/15/2020')
-end = pd.to_datetime('today').normalize()
-
-
-def random_time(start, end):
-    """Get a time between the start and end time.
+def random_times(start, end, size):
+    """Get size times between the start and end time, drawn at once.
     Both times should be datetime objects.
     """
-    random_date = start + (end - start) * random.random()
-    return random_date
-
-# Generate the fake data for groups
-a_group = df_dash.loc[df_dash['campaign_06/15/2020'] == 'A', ].sample(
-    300, random_state=1337).index
-df_dash.loc[df_dash.index[a_group],
-            'application_submission_date'] = df_dash.iloc[a_group, ].apply(
-                lambda x: random_time(start, end), 1)
-df_dash.loc[df_dash.index[a_group], 'cohort'] = current_session
-
-b_group = df_dash.loc[df_dash['campaign_06/15/2020'] == 'B', ].sample(
-    200, random_state=1337).index
-df_dash.loc[df_dash.index[b_group],
-            'application_submission_date'] = df_dash.iloc[b_group, ].apply(
-                lambda x: random_time(start, end), 1)
-df_dash.loc[df_dash.index[b_group], 'cohort'] = current_session
-
-c_group = df_dash.loc[df_dash['campaign_06/15/2020'] == 'Control', ].sample(
-    100, random_state=1337).index
-df_dash.loc[df_dash.index[c_group],
-            'application_submission_date'] = df_dash.iloc[c_group, ].apply(
-                lambda x: random_time(start, end), 1)
-df_dash.loc[df_dash.index[c_group], 'cohort'] = current_session
-
-# Create a second campaign for looping purposes
-df_dash['campaign_06/18/2020'] = df_dash['campaign_06/15/2020']
-
-# Round submission time to the day submitted
-df_dash['application_submission_date'] = df_dash[
-    'application_submission_date'].dt.floor('d')
-
-# List of all the campaigns
-campaign_names = df_dash.filter(regex='campaign', axis=1).columns.tolist()
-
-#Create an empty DataFrame to store data
-all_campaigns = pd.DataFrame(
-    columns=['Date', 'Condition', 'Counts', 'Campaign', 'Size'])
-
-# Loop to get counts for each campaign
-for i in campaign_names:
-    # Change all NA values into None
-    df_dash[i].fillna(value="None", inplace=True)
-
-    # Group by date and condition and return counts
-    counts = df_dash.groupby(
-        by=['application_submission_date', i]).size().reset_index()
-    counts.columns = ['Date', 'Condition', 'Counts']
-    min_date = counts.Date.min()
-    max_date = counts.Date.max()
-    counts.set_index(['Date', 'Condition'], inplace=True)
-
-    # Use indexing to fill in missing data
-    application_range = pd.date_range(min_date, max_date)
-    conditions = pd.Series(df_dash[i].unique()).sort_values()
-    new_index = pd.MultiIndex.from_product([application_range, conditions],
-                                           names=['Date', 'Condition'])
-    counts = counts.reindex(new_index).reset_index()
-
-    #Replace missing data with 0
-    counts.fillna(value=0, inplace=True)
-
-    # Add in an indicator for campaign
-    campaign_date = re.search('campaign_(.*)', i).group(1)
-    counts['Campaign'] = campaign_date
-
-    # Create a dictionary with sample size
-    condition_dictionary = df_dash[i].value_counts().to_dict()
-
-    # Create a column indicating size
-    counts['Size'] = counts['Condition'].map(condition_dictionary)
-
-    # Concatenate with other campaigns
-    all_campaigns = pd.concat([all_campaigns, counts])
-
-# Store all simulated data in a DataFrame    
-df = all_campaigns
-
-# Just to make the campaigns have different values
-df.loc[(df['Campaign'] == '06/18/2020') &
-       (df['Date'] > '06/14/2020'), 'Counts'] = df.loc[
-           (df['Campaign'] == '06/18/2020') &
-           (df['Date'] > '06/14/2020'), 'Counts'] + 10
-
-# Unique campaign dates
-campaigns = df['Campaign'].unique()
-           
+    return start + pd.to_timedelta(
+        np.random.random(size) * (end - start).total_seconds(), unit='s')
+
+
+# Function to load, merge and aggregate the campaign data
+def build_campaign_data():
+    if use_campaign_table and incremental_counts:
+        counts = DailyCounts.load(counts_path)
+        with metrics.stage('campaign aggregation'):
+            all_campaigns = counts.update(
+                get_engine('greenhouse'),
+                from_table(read_assignments(get_engine('campaign'))))
+        counts.save(counts_path)
+        return all_campaigns, {}
+
+    # Extract relevant columns (from the local cache unless completed_apps
+    # has changed)
+    with metrics.stage('extract'):
+        all_completed = cached_query(
+            'greenhouse', sql_query,
+            ['hashed_email_address', 'year', 'session',
+             'application_submission_date'],
+            connection=connect('greenhouse'), table='completed_apps',
+            timestamp='application_submission_date',
+            date_columns=['application_submission_date'])
+
+    # Integer email keys and categoricals; the addresses themselves aren't
+    # needed on the dashboard
+    all_completed = compact(all_completed).drop(
+        columns='hashed_email_address')
+
+    # Change data to datetype format in completed app dataset
+    all_completed['application_submission_date'] = pd.to_datetime(
+        all_completed['application_submission_date'],
+        infer_datetime_format=True).dt.tz_localize(None)
+
+    # Drop duplicates from completed file
+    all_completed.sort_values(by='application_submission_date',
+                              ascending=False,
+                              inplace=True)
+    all_completed.drop_duplicates('email_key', inplace=True)
+
+    # Create a feature indicating cohort
+    all_completed['cohort'] = all_completed['year'].astype(str).str.cat(
+        all_completed['session']).astype('category')
+
+    # Create a variable indicating current session
+    current_session = all_completed['cohort'].sort_values(
+        ascending=False).iloc[0]  #Current session
+
+    # Choose only data from current sesion (keeping past cohorts for the
+    # rollup)
+    past_completed = all_completed[all_completed['cohort'] != current_session]
+    all_completed = all_completed[all_completed['cohort'] == current_session]
+    session_start = all_completed['application_submission_date'].min()
+
+    if use_campaign_table:
+        # Read only the campaigns started since the current session opened
+        # (or every campaign for the rollup), from the table written by
+        # assignment.py (one row per assignment)
+        all_assignments = from_table(
+            read_assignments(get_engine('campaign'),
+                             since=None if historical else session_start))
+        current_campaigns = pd.to_datetime(
+            all_assignments['Campaign'],
+            format='%m/%d/%Y') >= session_start.normalize()
+        past_campaigns = compact(all_assignments[~current_campaigns])
+        df_campaign = all_assignments[current_campaigns]
+    else:
+        # Read in the campaign data from a csv file and change it to one row
+        # per assignment
+        df_campaign = to_long(pd.read_csv('simulated_data.csv'))
+        past_campaigns = None
+
+    # Change condition names
+    df_campaign.loc[(df_campaign['Campaign'] == '06/15/2020') &
+                    (df_campaign['Condition'] == 'C'), 'Condition'] = 'Control'
+
+    # Create a second campaign for looping purposes
+    first_campaign = df_campaign[df_campaign['Campaign'] == '06/15/2020']
+    df_campaign = pd.concat(
+        [df_campaign, first_campaign.assign(Campaign='06/18/2020')],
+        ignore_index=True)
+
+    # Integer email keys and categoricals
+    df_campaign = compact(df_campaign)
+
+    # Merge datasets; one row per applicant who submitted or was assigned
+    df_dash = all_completed.merge(
+        df_campaign[['email_key']].drop_duplicates(),
+        how = 'outer',
+        on = 'email_key')
+
+    # Span of dates for the fake data for demo
+    start = pd.to_datetime('06/15/2020')
+    end = pd.to_datetime('today').normalize()
+
+    # Generate the fake data for groups
+    first_campaign = df_campaign[df_campaign['Campaign'] == '06/15/2020']
+
+    a_group = df_dash['email_key'].isin(
+        first_campaign.loc[first_campaign['Condition'] == 'A',
+                           'email_key'].sample(
+                               300, random_state=1337))
+    df_dash.loc[a_group, 'application_submission_date'] = random_times(
+        start, end, a_group.sum())
+    df_dash.loc[a_group, 'cohort'] = current_session
+
+    b_group = df_dash['email_key'].isin(
+        first_campaign.loc[first_campaign['Condition'] == 'B',
+                           'email_key'].sample(
+                               200, random_state=1337))
+    df_dash.loc[b_group, 'application_submission_date'] = random_times(
+        start, end, b_group.sum())
+    df_dash.loc[b_group, 'cohort'] = current_session
+
+    c_group = df_dash['email_key'].isin(
+        first_campaign.loc[first_campaign['Condition'] == 'Control',
+                           'email_key'].sample(
+                               100, random_state=1337))
+    df_dash.loc[c_group, 'application_submission_date'] = random_times(
+        start, end, c_group.sum())
+    df_dash.loc[c_group, 'cohort'] = current_session
+
+    # Round submission time to the day submitted
+    df_dash['application_submission_date'] = df_dash[
+        'application_submission_date'].dt.floor('d')
+
+    # Get daily counts and sizes for every campaign and condition at once
+    with metrics.stage('campaign aggregation'):
+        all_campaigns = aggregate_campaigns(df_dash, df_campaign,
+                                            key='email_key')
+
+    extras = {}
+    if historical:
+        # Aggregate the campaigns of every cohort once, for comparisons
+        # across cohorts; saved in the snapshot's directory, so a new
+        # snapshot always comes with its rollup
+        columns = ['email_key', 'cohort', 'application_submission_date']
+        past_completed = past_completed[columns].assign(
+            application_submission_date=past_completed[
+                'application_submission_date'].dt.floor('d'))
+        with metrics.stage('rollup'):
+            extras['rollup'] = Rollup.build(
+                pd.concat([
+                    past_completed,
+                    df_dash.loc[df_dash['cohort'] == current_session, columns]
+                ], ignore_index=True),
+                pd.concat([past_campaigns, df_campaign],
+                          ignore_index=True))
+
+    # Store all simulated data in a DataFrame
+    df = all_campaigns
+
+    # Just to make the campaigns have different values
+    df.loc[(df['Campaign'] == '06/18/2020') &
+           (df['Date'] > '06/14/2020'), 'Counts'] = df.loc[
+               (df['Campaign'] == '06/18/2020') &
+               (df['Date'] > '06/14/2020'), 'Counts'] + 10
+    return df, extras
+
+
+# Shared on-disk snapshot of the data, rebuilt by one worker when stale
+shared_snapshot = SharedSnapshot(snapshot_dir, max_age=refresh_interval)
+
+
+# Function to map the shared snapshot, building it first if it is stale
+def load_campaign_data():
+    return shared_snapshot.load(build_campaign_data)
+
+
+# Load the data once; newer builds are picked up in the background (see the
+# end of the script) and callbacks read whichever snapshot is current when
+# they start
+refresher = SnapshotRefresher(load_campaign_data, interval=check_interval)
+
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 
 server = app.server
 
-campaigns = df['Campaign'].unique()
-
-# Produces the figure, table, text, and buttons
-app.layout = html.Div([
-    html.Div(
-        [html.Label("Please choose a campaign:")],
-        style={
-            'width': '100%',
-            'display': 'flex',
-            'align-items': 'center',
-            'justify-content': 'center'
-        }),
-    html.Div([
-        dcc.Dropdown(id='campaign-dropdown',
-                     options=[{
-                         'label': i,
-                         'value': i
-                     } for i in campaigns],
-                     value=df['Campaign'].unique()[0])
-    ],
-             style={'width': '100%'}),
-    html.Div([dcc.Graph(id='example-graph')]),
-    html.Div(
-        [html.Label("Please pick a span of dates:")],
-        style={
-            'width': '100%',
-            'display': 'flex',
-            'align-items': 'center',
-            'justify-content': 'center'
-        }),
-    html.Div(
-        [
-            dcc.DatePickerRange(
-                id='date-picker-range',
-                start_date=pd.to_datetime(df['Campaign'].unique()[0]) -
-                dt.timedelta(days=3),
-                end_date=max_date)
-        ],
-        style={
-            'width': '100%',
-            'display': 'flex',
-            'align-items': 'center',
-            'justify-content': 'center',
-            'padding': '10px 0px 10px 0px'
-        }),
-    html.Div(
-        [
-            html.Label(
-                "Lift is calculated over the time period specified above.")
+# Number of results kept for the most recent choices of campaign, dates and
+# counts in each callback
+cache_size = 256
+
+
+# Produces the figure, table, text, and buttons from the current snapshot;
+# Dash calls this on every page load, so new campaigns show up after a refresh
+def serve_layout():
+    store = refresher.current.store
+
+    # Unique campaign dates and the last day with data
+    campaigns = store.campaigns()
+    max_date = store.max_date()
+
+    return html.Div([
+        html.Div(
+            [html.Label("Please choose a campaign:")],
+            style={
+                'width': '100%',
+                'display': 'flex',
+                'align-items': 'center',
+                'justify-content': 'center'
+            }),
+        html.Div([
+            dcc.Dropdown(id='campaign-dropdown',
+                         options=[{
+                             'label': i,
+                             'value': i
+                         } for i in campaigns],
+                         value=campaigns[0])
         ],
-        style={
-            'width': '100%',
-            'display': 'flex',
-            'align-items': 'center',
-            'justify-content': 'center'
-        }),
-    html.Div(id='text-summary',
-             style={
-                 'width': '100%',
-                 'display': 'flex',
-                 'align-items': 'center',
-                 'justify-content': 'center'
-             }),
-    html.Div(
-        [
-            dcc.RadioItems(id='radio-item',
-                           options=[
-                               {
-                                   'label': 'Raw Counts',
-                                   'value': 'counts'
-                               },
-                               {
-                                   'label': 'Adjusted Counts',
-                                   'value': 'adjusted'
-                               },
-                           ],
-                           value='counts',
-                           labelStyle={'display': 'inline-block'})
-        ],
-        style={
-            'width': '100%',
-            'display': 'flex',
-            'align-items': 'center',
-            'justify-content': 'center',
-            'padding': '10px 0px 20px 0px'
-        }),
-])
-
-
-# Updates the figure
-@app.callback(Output(
-    component_id='example-graph', component_property='figure'), [
+                 style={'width': '100%'}),
+        html.Div([dcc.Graph(id='example-graph')]),
+        dcc.Store(id='campaign-data'),
+        html.Div(
+            [html.Label("Please pick a span of dates:")],
+            style={
+                'width': '100%',
+                'display': 'flex',
+                'align-items': 'center',
+                'justify-content': 'center'
+            }),
+        html.Div(
+            [
+                dcc.DatePickerRange(
+                    id='date-picker-range',
+                    start_date=pd.to_datetime(campaigns[0]) -
+                    dt.timedelta(days=3),
+                    end_date=max_date)
+            ],
+            style={
+                'width': '100%',
+                'display': 'flex',
+                'align-items': 'center',
+                'justify-content': 'center',
+                'padding': '10px 0px 10px 0px'
+            }),
+        html.Div(
+            [
+                html.Label(
+                    "Lift is calculated over the time period specified above.")
+            ],
+            style={
+                'width': '100%',
+                'display': 'flex',
+                'align-items': 'center',
+                'justify-content': 'center'
+            }),
+        html.Div(id='text-summary',
+                 style={
+                     'width': '100%',
+                     'display': 'flex',
+                     'align-items': 'center',
+                     'justify-content': 'center'
+                 }),
+        html.Div(
+            [
+                dcc.RadioItems(id='radio-item',
+                               options=[
+                                   {
+                                       'label': 'Raw Counts',
+                                       'value': 'counts'
+                                   },
+                                   {
+                                       'label': 'Adjusted Counts',
+                                       'value': 'adjusted'
+                                   },
+                               ],
+                               value='counts',
+                               labelStyle={'display': 'inline-block'})
+            ],
+            style={
+                'width': '100%',
+                'display': 'flex',
+                'align-items': 'center',
+                'justify-content': 'center',
+                'padding': '10px 0px 20px 0px'
+            }),
+        html.Div(
+            [html.Label("Compare campaigns across cohorts:")],
+            style={
+                'width': '100%',
+                'display': 'flex',
+                'align-items': 'center',
+                'justify-content': 'center'
+            }),
+        html.Div(
+            [
+                dcc.RadioItems(id='history-mode',
+                               options=[
+                                   {
+                                       'label': 'Lift per Cohort',
+                                       'value': 'lift'
+                                   },
+                                   {
+                                       'label': 'Weekly Submissions',
+                                       'value': 'weekly'
+                                   },
+                               ],
+                               value='lift',
+                               labelStyle={'display': 'inline-block'})
+            ],
+            style={
+                'width': '100%',
+                'display': 'flex',
+                'align-items': 'center',
+                'justify-content': 'center',
+                'padding': '10px 0px 10px 0px'
+            }),
+        html.Div([dcc.Graph(id='history-graph')]),
+    ])
+
+
+app.layout = serve_layout
+
+
+# Sends the daily counts of the chosen campaign to the browser; binned counts
+# are rebuilt for the chosen dates, as bins can't be trimmed in the browser
+@app.callback(
+    Output(component_id='campaign-data', component_property='data'), [
         Input(component_id='date-picker-range',
               component_property='start_date'),
         Input(component_id='date-picker-range', component_property='end_date'),
-        Input(component_id='radio-item', component_property='value'),
         Input(component_id='campaign-dropdown', component_property='value')
     ])
-def update_output_figure(start_date, end_date, value_counts, value_campaign):
-    df_campaign = df[df['Campaign'] == value_campaign].copy()
-    df_date = df_campaign[(df_campaign['Date'] >= start_date)
-                          & (df_campaign['Date'] <= end_date)].copy()
-    study_size = df_date.loc[df_date['Condition'] != 'None', 'Size'].unique(
-    ).sum()
-    data_list = []
-    if value_counts == 'counts':
-        for i in conditions:
-            if (i != 'None'):
-                df_subset = df_date[df_date['Condition'] == i].copy()
-                data_list.append(
-                    go.Scatter(x=df_subset['Date'],
-                               y=df_subset['Counts'],
-                               name=i))
-        return {
-            'data':
-            data_list,
-            "layout":
-            go.Layout(  #title = {"text": "Submissions Per Day"}, 
-                yaxis={"title": "Number of Submissions"},
-                legend={
-                    "x": 0.05,
-                    "y": 1.1
-                })
-        }
-    if value_counts == 'adjusted':
-        for i in conditions:
-            if (i != 'None'):
-                df_subset = df_date[df_date['Condition'] == i].copy()
-                data_list.append(
-                    go.Scatter(
-                        x=df_subset['Date'],
-                        y=((df_subset['Counts'] / df_subset['Size'].mean()) *  
-                           (study_size / (len(conditions) - 1))).round(),
-                        name=i))
-        return {
-            'data':
-            data_list,
-            "layout":
-            go.Layout(  #title = {"text": "Submissions Per Day"}, 
-                yaxis={"title": "Number of Submissions"},
-                legend={
-                    "x": 0.05,
-                    "y": 1.1
-                })
-        }
+@metrics.timer()
+def update_output_figure(start_date, end_date, value_campaign):
+    if not max_points:
+        # Every day is sent once and the browser trims them to the dates
+        triggered = dash.callback_context.triggered[0]['prop_id']
+        if triggered.startswith('date-picker-range.'):
+            return dash.no_update
+        start_date = end_date = None
+    return campaign_payload(refresher.current, value_campaign, start_date,
+                            end_date)
+
+
+# Builds the counts for a snapshot, campaign and (when binned) dates
+@lru_cache(maxsize=cache_size)
+def campaign_payload(snapshot, value_campaign, start_date, end_date):
+    return counts_payload(snapshot.store, value_campaign, max_points,
+                          start_date, end_date)
+
+
+# Draws the figure in the browser (see assets/campaign_figure.js), so picking
+# raw or adjusted counts (or other dates, unless binned) needs no request to
+# the server
+app.clientside_callback(
+    ClientsideFunction(namespace='campaign', function_name='figure'),
+    Output(component_id='example-graph', component_property='figure'), [
+        Input(component_id='campaign-data', component_property='data'),
+        Input(component_id='date-picker-range',
+              component_property='start_date'),
+        Input(component_id='date-picker-range', component_property='end_date'),
+        Input(component_id='radio-item', component_property='value')
+    ])
 
 
 # Updates the text summary
@@ -351,46 +455,91 @@ def update_output_figure(start_date, end_date, value_counts, value_campaign):
         Input(component_id='date-picker-range', component_property='end_date'),
         Input(component_id='campaign-dropdown', component_property='value')
     ])
+@metrics.timer()
 def update_output_text(start_date, end_date, value_campaign):
-    df_campaign = df[df['Campaign'] == value_campaign].copy()
-    df_date = df_campaign[(df_campaign['Date'] >= start_date)
-                          & (df_campaign['Date'] <= end_date)].copy()
-    study_size = df_date.loc[df_date['Condition'] != 'None', 'Size'].unique(
-    ).sum()
-    lift_list = []
-    control_list = []
-    chi_list = []
-    for i in conditions:
-        if (i != 'None') & (i != 'Control'):
-            df_subset = df_date[df_date['Condition'] == i].copy()
-            lift = df_subset['Counts'].sum() / (df_subset['Size'].mean() /
-                                                study_size)
-            lift = lift.round().astype('int')
-            lift_list.append(lift)
-            chi_counts = ([df_subset['Counts'].sum(), 
-                           df_subset['Size'].mean() - df_subset['Counts'].sum()])
-            chi_list.append(chi_counts)            
-        if i == 'Control':
-            df_subset = df_date[df_date['Condition'] == i].copy()
-            lift = df_subset['Counts'].sum() / (df_subset['Size'].mean() /
-                                                study_size)
-            lift = lift.round().astype('int')
-            control_list.append(lift)
-            con_counts = ([df_subset['Counts'].sum(), 
-                           df_subset['Size'].mean() - df_subset['Counts'].sum()])
-    lift = (np.array(lift_list) -
-            np.array(control_list)) / np.array(control_list)
-    lift = (lift * 100).round().astype('int')
-    lift_statement = ''
-    index_num = 0
-    for i in conditions:
-        p_value = stats.fisher_exact([chi_list[index_num], con_counts])[1]
-        if (i != 'None') & (i != 'Control'):
-            message = 'Lift for {} campaign is {}%, p = {:.2f}. '.format(
-                i, lift[index_num], p_value)
-            lift_statement = lift_statement + message
-            index_num = +1
-    return lift_statement
+    return campaign_summary(refresher.current, value_campaign, start_date,
+                            end_date)
+
+
+# Builds the lift summary for a snapshot, campaign and span of dates
+@lru_cache(maxsize=cache_size)
+def campaign_summary(snapshot, value_campaign, start_date, end_date):
+    return lift_summary(snapshot.store, value_campaign, start_date, end_date)
+
+
+# Updates the figure comparing cohorts
+@app.callback(
+    Output(component_id='history-graph', component_property='figure'),
+    [Input(component_id='history-mode', component_property='value')])
+@metrics.timer()
+def update_history_figure(value_mode):
+    return history_figure(refresher.current, value_mode)
+
+
+# Reads the rollup of every cohort saved with the snapshot
+@lru_cache(maxsize=1)
+def snapshot_rollup(snapshot):
+    path = shared_snapshot.extra_path(
+        'rollup', shared_snapshot.version_of(snapshot.data))
+    if path is None:
+        return None
+    return Rollup.load(path)
+
+
+# Builds the figure comparing cohorts from the rollup
+@lru_cache(maxsize=cache_size)
+def history_figure(snapshot, value_mode):
+    return cohort_figure(snapshot_rollup(snapshot), value_mode)
+
+
+# Reads the token allowing rebuilds on demand, or None without one
+@lru_cache(maxsize=1)
+def refresh_token():
+    try:
+        with open(refresh_token_file) as f:
+            return f.readline().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# Rebuild the data on demand, for holders of the token and at most once per
+# min_refresh_age seconds across workers, so the database isn't re-queried
+# at will
+@server.route('/refresh', methods=['POST'])
+def refresh_data():
+    token = refresh_token()
+    if token is None or not hmac.compare_digest(
+            request.headers.get('X-Refresh-Token', ''), token):
+        return 'Forbidden', 403
+    age = shared_snapshot.age()
+    if age is not None and age < min_refresh_age:
+        return 'Data were rebuilt {:.0f} s ago'.format(age), 429
+    shared_snapshot.expire()
+    refresher.refresh()
+    return 'Refresh started', 202
+
+
+# Campaign counts, sizes, lift and p-values as JSON for other tools (see
+# api.py), cached per snapshot and revalidated with ETags
+server.register_blueprint(aggregates_api(lambda: refresher.current))
+
+
+# Timings of the build stages and latency histograms of the callbacks, in
+# the Prometheus text format; each gunicorn worker reports its own
+@server.route('/metrics')
+def serve_metrics():
+    return Response(metrics.prometheus(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+# Start rebuilding in the background; cached results for old snapshots are
+# dropped once a new one is swapped in
+refresher.on_swap += [
+    campaign_payload.cache_clear, campaign_summary.cache_clear,
+    snapshot_rollup.cache_clear, history_figure.cache_clear,
+    cached_response.cache_clear, snapshot_etag.cache_clear
+]
+refresher.start()
 
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import pandas as pd
+
+# For assigning groups
+from randomization import assign_groups
+
+
+def flag_eligible(df, current_session, programs):
+    """Add the columns deciding who to nudge to merged applications.
+    df holds unfinished applications merged with finished ones, and is
+    changed in place; to_nudge marks the applicants to A/B test.
+    """
+    # Calculate days since an application was last completed
+    df['days_since_updated'] = (pd.to_datetime('today') -
+                                df['updated_at']).dt.days
+
+    # Create a boolean indicating whether an app has been updated in last 6
+    # months
+    df['updated_recent'] = df['days_since_updated'] < (365 / 2)
+
+    # Create a boolean indicating if an app was submitted in the current
+    # session
+    df['current_submission'] = df['cohort'] == current_session
+
+    # Create a boolean indicating whether an applicant was accepted in a
+    # prior session
+    df['accepted'] = df['status'] == 'Accepted'
+
+    # Create a boolean indicating who has information about their program
+    df['has_program'] = df['program'].notna()
+
+    # Create a boolean indicating who reported interest in the programs
+    df['top_four'] = df['program'].isin(programs)
+
+    # Create a boolean indicating who to nudge:
+    # 1) Activity in the past 6 months
+    # 2) No submission in current cycle
+    # 3) Has information about a program of interest
+    # 4) Not accepted to Insight already
+    # 5) Not on avoid list
+    df['to_nudge'] = (
+        (df['updated_recent']) &
+        (df['current_submission'] == False) &
+        (df['top_four']) &
+        (df['accepted'] == False) &
+        ((df['dont_interview'] == False) | df['dont_interview'].isna())
+                     )
+    return df
+
+
+def assign_partition(apps, completed, current_session, programs, campaign,
+                     groups):
+    """Merge, flag and assign one partition of the applications.
+    apps and completed hold the same bucket of email keys (see
+    partitions.map_partitions). Returns only the applicants nudged, with
+    their group in the campaign column.
+    """
+    df = apps.merge(completed.drop(columns='hashed_email_address',
+                                   errors='ignore'),
+                    how='left',
+                    on='email_key')
+    flag_eligible(df, current_session, programs)
+    df = df[df['to_nudge']].copy()
+    df[campaign] = assign_groups(df['hashed_email_address'], campaign, groups)
+    return df
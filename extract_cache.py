@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import pandas as pd
+
+# Other utilities
+import hashlib # For naming cached extracts
+import json # For storing the state of the source
+import os # For cache paths
+
+# For executing SQL queries
+from extraction import execute_query
+
+# Directory of cached extracts
+cache_dir = 'extract_cache'
+
+
+def cache_path(source, query, cache_dir=cache_dir):
+    """Return the path (without extension) of a source and query's extract."""
+    key = hashlib.sha1((source + '\n' + query).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '%s-%s' % (source, key[:16]))
+
+
+def checksum_sql(checksum):
+    """Return a Postgres aggregate hashing the values of the checksum
+    columns in every row (NULLs included), in a fixed order.
+    """
+    row = "concat_ws('|', {})".format(', '.join(
+        'quote_nullable({})'.format(i) for i in checksum))
+    return "md5(string_agg({0}, ',' ORDER BY {0}))".format(row)
+
+
+def cached_query(source, query, columns, connection, table, timestamp,
+                 date_columns=(), checksum=(), cache_dir=cache_dir):
+    """Return the results of a query as a DataFrame, from a local Feather
+    file when the source hasn't changed.
+    Change detection asks the database only for the row count and latest
+    timestamp of table, plus a hash of the checksum columns of every row if
+    any are given; if they match the values saved with the cached extract,
+    the extract is read from disk. Otherwise the query is run, the
+    date_columns are parsed once and everything is stored with native
+    types. Without checksum columns, changes that keep both the row count
+    and latest timestamp (such as edits to older rows) are not detected, so
+    tables edited in place should name the columns that change.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(source, query, cache_dir)
+
+    # Cheap check of the state of the source
+    aggregates = ['count(*)', 'max({})'.format(timestamp)]
+    if checksum:
+        aggregates.append(checksum_sql(checksum))
+    cur = connection.cursor()
+    cur.execute('SELECT {} FROM {};'.format(', '.join(aggregates), table))
+    values = cur.fetchone()
+    cur.close()
+    state = {'rows': values[0], 'latest': str(values[1])}
+    if checksum:
+        state['checksum'] = values[2]
+
+    if os.path.exists(path + '.json') and os.path.exists(path + '.feather'):
+        with open(path + '.json') as f:
+            if json.load(f) == state:
+                connection.close()
+                return pd.read_feather(path + '.feather')
+
+    data = execute_query(query, connection=connection)
+    data = pd.DataFrame(data, columns=columns)
+    for i in date_columns:
+        data[i] = pd.to_datetime(data[i], infer_datetime_format=True)
+
+    # Write the extract before its state, so a state on disk always has a
+    # complete extract
+    data.to_feather(path + '.feather')
+    with open(path + '.json', 'w') as f:
+        json.dump(state, f)
+    return data
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import pandas as pd
+
+# Other utilities
+import json # For storing watermarks
+import os # For snapshot paths
+import threading # For guarding the watermark file
+import time # For timing each source
+from concurrent.futures import ThreadPoolExecutor # For parallel extraction
+
+# Query and column names for finished applications (greenhouse server)
+completed_query = """
+SELECT hashed_email_address, year, session, application_submission_date,
+       currnent_stage_in_greenhouse, do_not_interview_tag
+FROM completed_apps
+"""
+
+completed_columns = [
+    'hashed_email_address', 'year', 'session', 'application_submission_date',
+    'status', 'dont_interview'
+]
+
+# Query and column names for unfinished applications (heroku server)
+apps_query = """
+SELECT hashed_email_address, program, created_at, updated_at, ai_motivation,
+       ai_tools, coursework, dc_education, dc_innovation,
+       dc_motivation, de_motivation, debugging, dev_ops_motivation,
+       ds_motivation, largest_codebase, largest_team,
+       ml_innovation, ml_problem, networking, sec_motivation,
+       sec_tradeoffs, side_projects, statistical_methods,
+       technical_tradeoffs, tools
+FROM consulting_heroku_export
+"""
+
+apps_columns = [
+    'hashed_email_address', 'program', 'created_at', 'updated_at',
+    'ai_motivation', 'ai_tools', 'coursework', 'dc_education',
+    'dc_innovation', 'dc_motivation', 'de_motivation', 'debugging',
+    'dev_ops_motivation', 'ds_motivation', 'largest_codebase',
+    'largest_team', 'ml_innovation', 'ml_problem', 'networking',
+    'sec_motivation', 'sec_tradeoffs', 'side_projects',
+    'statistical_methods', 'technical_tradeoffs', 'tools'
+]
+
+
+# Query for the latest finished application per applicant; the dedup that
+# assignment.py does with sort_values and drop_duplicates
+latest_completed_query = """
+SELECT DISTINCT ON (hashed_email_address)
+       hashed_email_address, year, session, application_submission_date,
+       currnent_stage_in_greenhouse, do_not_interview_tag
+FROM completed_apps
+ORDER BY hashed_email_address, application_submission_date DESC NULLS LAST;
+"""
+
+# Columns returned by the eligible applications query
+eligible_columns = [
+    'hashed_email_address', 'program', 'updated_at', 'no_space_count'
+]
+
+
+def eligible_apps_query(writing_questions, start_date, recent_cutoff,
+                        programs):
+    """Build a query returning only unfinished applications eligible to nudge.
+    The start_date cutoff, recent activity, program of interest and the
+    gibberish filter (fewer than five non-empty responses without a space)
+    are all evaluated by the database. Returns the query and its arguments.
+    """
+    no_space = ' +\n'.join(
+        "        (CASE WHEN %s <> '' AND strpos(%s, ' ') = 0 "
+        "THEN 1 ELSE 0 END)" % (i, i) for i in writing_questions)
+    query = """
+SELECT hashed_email_address, program, updated_at, no_space_count
+FROM (
+    SELECT hashed_email_address, program, updated_at,
+%s AS no_space_count
+    FROM consulting_heroku_export
+    WHERE created_at > %%(start_date)s
+      AND updated_at > %%(recent_cutoff)s
+      AND program IN %%(programs)s
+) AS apps
+WHERE no_space_count < 5;
+""" % no_space
+    args = {
+        'start_date': start_date.to_pydatetime(),
+        'recent_cutoff': recent_cutoff.to_pydatetime(),
+        'programs': tuple(programs)
+    }
+    return query, args
+
+
+# Function to execute SQL queries
+def execute_query(query, connection, args=None):
+    con = connection
+    cur = con.cursor()
+    if args:
+        cur.execute(query, args)
+    else:
+        cur.execute(query)
+
+    results = cur.fetchall()
+    cur.close()
+    con.close()
+    return results
+
+
+# Function to stream SQL query results in chunks
+def stream_query(query, connection, columns, args=None, itersize=10000,
+                 cursor_name='stream_query'):
+    """Yield the results of a query as DataFrames of at most itersize rows.
+    A named (server-side) cursor keeps the result set on the database, so
+    only one chunk is held in memory at a time.
+    """
+    con = connection
+    cur = con.cursor(name=cursor_name)
+    cur.itersize = itersize
+    if args:
+        cur.execute(query, args)
+    else:
+        cur.execute(query)
+
+    try:
+        while True:
+            rows = cur.fetchmany(itersize)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=columns)
+    finally:
+        cur.close()
+        con.close()
+
+
+# Functions to keep track of the last value seen for each source; sources
+# may be extracted in parallel, so updates to the file are serialized
+watermark_lock = threading.Lock()
+
+
+def read_watermarks(snapshot_dir):
+    """Return a dictionary of high-water marks saved by the last run.
+    Sources that have never been loaded are missing from the dictionary.
+    """
+    path = os.path.join(snapshot_dir, 'watermarks.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_watermarks(watermarks, snapshot_dir):
+    """Save the high-water marks once the snapshots are written."""
+    path = os.path.join(snapshot_dir, 'watermarks.json')
+    with open(path, 'w') as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+
+
+def merge_snapshot(snapshot, new_rows, keys):
+    """Add newly fetched rows to a stored snapshot.
+    Rows sharing the same keys are replaced by the fetched version.
+    """
+    merged = pd.concat([snapshot, new_rows], ignore_index=True)
+    merged.drop_duplicates(keys, keep='last', inplace=True)
+    merged.reset_index(drop=True, inplace=True)
+    return merged
+
+
+def extract_incremental(source, query, columns, watermark, keys, connection,
+                        snapshot_dir='snapshots'):
+    """Fetch rows changed since the last run and merge them into a snapshot.
+    The first run (no snapshot on disk) does a full load. Later runs only
+    request rows whose watermark column is at or after the stored mark; the
+    overlap on the boundary is removed when merging on keys.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    snapshot_path = os.path.join(snapshot_dir, source + '.pkl')
+    watermarks = read_watermarks(snapshot_dir)
+
+    if os.path.exists(snapshot_path) and source in watermarks:
+        snapshot = pd.read_pickle(snapshot_path)
+        new_rows = execute_query(query.rstrip() + '\nWHERE %s >= %%s;' %
+                                 watermark,
+                                 connection=connection,
+                                 args=(watermarks[source], ))
+        new_rows = pd.DataFrame(new_rows, columns=columns)
+        data = merge_snapshot(snapshot, new_rows, keys)
+    else:
+        data = execute_query(query.rstrip() + ';', connection=connection)
+        data = pd.DataFrame(data, columns=columns)
+
+    data.to_pickle(snapshot_path)
+
+    # Move the high-water mark forward only if something was seen
+    if data[watermark].notna().any():
+        with watermark_lock:
+            watermarks = read_watermarks(snapshot_dir)
+            watermarks[source] = pd.to_datetime(
+                data[watermark]).max().isoformat()
+            write_watermarks(watermarks, snapshot_dir)
+    return data
+
+
+# Functions to run extractions in parallel and time them
+def timed(function, name, timings):
+    """Call a function and store how long it took (seconds) under name."""
+    start = time.perf_counter()
+    try:
+        return function()
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def extract_concurrently(extractors, timings):
+    """Start every extractor (a dictionary of name: function) in its own thread.
+    The database drivers release the GIL while waiting on the network, so the
+    queries run in parallel. Returns a dictionary of futures by name; the
+    timings dictionary is filled in as each extractor finishes.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(extractors))
+    futures = {
+        name: executor.submit(timed, function, name, timings)
+        for name, function in extractors.items()
+    }
+    executor.shutdown(wait=False)
+    return futures
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For analyses
+import numpy as np
+import pandas as pd
+
+# For dash plots
+import plotly.graph_objects as go
+
+# For fishers exact test
+from significance import fisher_pvalues
+
+# For confidence intervals of lift
+from bootstrap import campaign_intervals, confidence
+
+
+def counts_payload(store, value_campaign, max_points=None, start_date=None,
+                   end_date=None):
+    """Daily submissions of every condition of a campaign, as lists ready
+    for the browser, which picks raw or adjusted counts and trims them to
+    the chosen dates (see assets/campaign_figure.js).
+    Each series has its dates (YYYY-MM-DD), counts and the condition's size;
+    adjusted counts are counts / size * study size / (conditions - 1), the
+    study size being the sum of the distinct sizes of conditions with days
+    in the chosen span. With max_points, only the days between start_date
+    and end_date (if given) are sent, and spans of more days are summed into
+    bins of days_per_point days from the span's first day (the last bin may
+    be shorter) so at most max_points points are sent per series; bins
+    can't be trimmed in the browser, so the payload is rebuilt for each
+    span.
+    """
+    conditions = store.conditions(value_campaign)
+    windows = {
+        i: (store.dates[value_campaign, i], store.counts[value_campaign, i])
+        for i in conditions if i != 'None'
+    }
+    if max_points and (start_date is not None or end_date is not None):
+        windows = {
+            i: store.window(value_campaign, i,
+                            '1970-01-01' if start_date is None else start_date,
+                            store.max_date() if end_date is None else end_date)
+            for i in windows
+        }
+
+    # Days summed into each point
+    days_per_point = 1
+    spans = [dates for dates, _ in windows.values() if len(dates)]
+    if max_points and spans:
+        first = min(dates[0] for dates in spans)
+        last = max(dates[-1] for dates in spans)
+        n_days = int((last - first) // np.timedelta64(1, 'D')) + 1
+        days_per_point = max(-(-n_days // max_points), 1)
+
+    series = []
+    for i, (dates, counts) in windows.items():
+        if days_per_point > 1:
+            bins = (dates - first) // np.timedelta64(days_per_point, 'D')
+            bins, inverse = np.unique(bins, return_inverse=True)
+            dates = first + bins * np.timedelta64(days_per_point, 'D')
+            counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        series.append({
+            'name': i,
+            'x': np.datetime_as_string(dates, unit='D').tolist(),
+            'y': np.asarray(counts).tolist(),
+            'size': int(store.size(value_campaign, i))
+        })
+    return {
+        'series': series,
+        'n_conditions': len(conditions),
+        'days_per_point': days_per_point
+    }
+
+
+def lift_table(store, value_campaign, start_date, end_date):
+    """Lift of each treatment over the control between start_date and
+    end_date. Returns a DataFrame with one row per treatment: Condition,
+    Submissions and Size (of the treatment), Lift, Lower and Upper (percent)
+    and p. Lift is (treatment rate / control rate - 1) * 100, NaN when the
+    control has no submissions in the window.
+    """
+    conditions = store.conditions(value_campaign)
+    chi_list = []
+    for i in conditions:
+        if (i != 'None') & (i != 'Control'):
+            total = store.total(value_campaign, i, start_date, end_date)
+            size = store.size(value_campaign, i)
+            chi_counts = ([total, size - total])
+            chi_list.append(chi_counts)
+        if i == 'Control':
+            total = store.total(value_campaign, i, start_date, end_date)
+            size = store.size(value_campaign, i)
+            con_counts = ([total, size - total])
+    p_values = fisher_pvalues([[i, con_counts] for i in chi_list])
+
+    # Lift from the same unrounded rates as its interval, so it lies within
+    intervals = campaign_intervals(store, start_date, end_date,
+                                   campaigns=[value_campaign])
+    treatments = [i for i in conditions if (i != 'None') & (i != 'Control')]
+    return pd.DataFrame({
+        'Condition': treatments,
+        'Submissions': [i[0] for i in chi_list],
+        'Size': [sum(i) for i in chi_list],
+        'Lift': intervals['Lift'],
+        'Lower': intervals['Lower'],
+        'Upper': intervals['Upper'],
+        'p': p_values
+    }, columns=['Condition', 'Submissions', 'Size', 'Lift', 'Lower', 'Upper',
+                'p'])
+
+
+def lift_summary(store, value_campaign, start_date, end_date):
+    """Text reporting the lift of each treatment with its confidence
+    interval and p-value.
+    """
+    lift_statement = ''
+    for row in lift_table(store, value_campaign, start_date,
+                          end_date).itertuples():
+        message = ('Lift for {} campaign is {:.0f}% ({:.0%} CI {:.0f}% to '
+                   '{:.0f}%), p = {:.2f}. ').format(
+                       row.Condition, row.Lift, confidence, row.Lower,
+                       row.Upper, row.p)
+        lift_statement = lift_statement + message
+    return lift_statement
+
+
+def cohort_figure(rollup, value_mode):
+    """Figure comparing cohorts from a Rollup (no applicant rows are read):
+    lift per cohort or weekly submissions.
+    """
+    data_list = []
+    if rollup is None:
+        return {'data': data_list, 'layout': go.Layout()}
+    if value_mode == 'lift':
+        # Lift of each treatment over its control, for the whole cohort
+        lift = rollup.lift()
+        for i in pd.unique(lift['Condition'].astype(object)):
+            rows = lift[lift['Condition'] == i]
+            data_list.append(
+                go.Bar(x=rows['Cohort'].astype(str) + ' ' +
+                       rows['Campaign'].astype(str),
+                       y=rows['Lift'],
+                       text=['p = {:.2f}'.format(p) for p in rows['p']],
+                       name=i))
+        return {
+            'data': data_list,
+            'layout': go.Layout(yaxis={"title": "Lift (%)"},
+                                legend={
+                                    "x": 0.05,
+                                    "y": 1.1
+                                })
+        }
+    if value_mode == 'weekly':
+        # Submissions per 1,000 applicants by week of the cohort, so cohorts
+        # line up
+        weekly = rollup.weekly[rollup.weekly['Condition'] != 'None']
+        weeks = (weekly['Week'] - weekly.groupby(
+            'Cohort', observed=True)['Week'].transform('min')).dt.days // 7
+        rates = weekly['Counts'] / weekly['Size'] * 1000
+        for (cohort, campaign, condition), rows in weekly.groupby(
+                ['Cohort', 'Campaign', 'Condition'], observed=True):
+            data_list.append(
+                go.Scatter(x=weeks[rows.index],
+                           y=rates[rows.index],
+                           name='{} {} {}'.format(cohort, campaign,
+                                                  condition)))
+        return {
+            'data': data_list,
+            'layout': go.Layout(xaxis={"title": "Week of Cohort"},
+                                yaxis={"title": "Submissions per 1,000"})
+        }
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Gibberish responses typically don't have any spaces, so applications with
+# this many responses (or more) without a space are removed
+cutoff = 5
+
+
+def no_space_counts(frame, columns):
+    """Count the non-empty responses without a space for each application.
+    All columns are scored in one pass: the responses are joined into a
+    single UTF-8 buffer (separated by NUL, which can't appear in postgres
+    text) and the spaces are located with NumPy. Missing values and empty
+    strings are not counted. Returns a Series aligned with the frame.
+    """
+    if len(frame) == 0 or len(columns) == 0:
+        return pd.Series(0, index=frame.index, name='no_space_count')
+
+    # Column-major array of the responses; only references are copied
+    responses = np.concatenate(
+        [frame[i].to_numpy(dtype=object) for i in columns])
+    responses[pd.isna(responses)] = ''
+
+    # Positions of the separators and spaces in the joined buffer
+    buffer = np.frombuffer('\x00'.join(responses).encode('utf-8'),
+                           dtype=np.uint8)
+    separators = np.flatnonzero(buffer == 0)
+    spaces = np.flatnonzero(buffer == 32)
+
+    # Start and end of every response
+    starts = np.concatenate([[0], separators + 1])
+    ends = np.concatenate([separators, [buffer.size]])
+
+    # A response has a space if the first space after its start comes before
+    # its end
+    first_space = np.searchsorted(spaces, starts)
+    has_space = np.zeros(starts.size, dtype=bool)
+    found = first_space < spaces.size
+    has_space[found] = spaces[first_space[found]] < ends[found]
+
+    no_space = (ends > starts) & ~has_space
+    counts = no_space.reshape(len(columns), len(frame)).sum(axis=0)
+    return pd.Series(counts, index=frame.index, name='no_space_count')
+
+
+def keep_applications(frame, columns):
+    """Return a boolean Series marking the applications that aren't gibberish.
+    """
+    return no_space_counts(frame, columns) < cutoff
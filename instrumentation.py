@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Other utilities
+import bisect # For finding histogram buckets
+import functools # For wrapping timed functions
+import json # For run reports
+import sys # For the units of peak memory
+import threading # For recording from callbacks in several threads
+import time # For timing stages
+from contextlib import contextmanager # For timing blocks of code
+
+# Peak resident memory of the process (not available on Windows)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Upper bounds (seconds) of the latency histogram buckets
+latency_buckets = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def peak_memory():
+    """Return the peak resident memory of the process so far in bytes, or
+    None where it can't be read.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Histogram:
+    """Counts of observations at or below each bucket's upper bound, plus
+    their total and count, as in a Prometheus histogram.
+    """
+    def __init__(self, buckets=latency_buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Return (upper bound, observations at or below it) for every
+        bucket, ending with infinity.
+        """
+        total = 0
+        bounds = []
+        for bound, n in zip(self.buckets + (float('inf'), ), self.counts):
+            total += n
+            bounds.append((bound, total))
+        return bounds
+
+
+class Metrics:
+    """Timings and peak memory of pipeline stages and latency histograms of
+    functions such as the dashboard callbacks.
+    stage() times a block of code and records the peak resident memory of
+    the process when it ends (and how much the block raised it); timer()
+    wraps a function so every call's latency goes into a histogram. Both
+    cost two clock reads and, for stages, one getrusage call, so they can
+    stay on in production. Each process has its own metrics.
+    """
+    def __init__(self, buckets=latency_buckets):
+        self.buckets = buckets
+        self.stages = {}
+        self.histograms = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block under name. A stage run more than once (say for
+        every chunk of a stream) adds up its seconds and memory increases.
+        """
+        before = peak_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            after = peak_memory()
+            with self._lock:
+                stage = self.stages.setdefault(name, {
+                    'seconds': 0.0,
+                    'calls': 0,
+                    'peak_memory': None,
+                    'peak_increase': None
+                })
+                stage['seconds'] += seconds
+                stage['calls'] += 1
+                stage['last_seconds'] = seconds
+                if after is not None:
+                    stage['peak_memory'] = after
+                    stage['peak_increase'] = (stage['peak_increase'] or
+                                              0) + after - before
+
+    def observe(self, name, seconds):
+        """Add one latency (seconds) to the histogram under name."""
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(self.buckets)
+            self.histograms[name].observe(seconds)
+
+    def timer(self, name=None):
+        """Decorator recording the latency of every call of a function (under
+        its name by default), whether it returns or raises.
+        """
+        def decorate(function):
+            label = name or function.__name__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(label, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def report(self):
+        """Return the stages and histograms as a dictionary."""
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'peak_memory': peak_memory(),
+                'stages': {k: dict(v) for k, v in self.stages.items()},
+                'latency': {
+                    k: {
+                        'count': v.count,
+                        'sum': v.sum,
+                        'buckets': [[bound, n]
+                                    for bound, n in v.cumulative()]
+                    }
+                    for k, v in self.histograms.items()
+                }
+            }
+
+    def save_report(self, path, **extra):
+        """Write the report (plus any extra fields) to path as JSON."""
+        report = self.report()
+        report.update(extra)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        return report
+
+    def prometheus(self):
+        """Return the metrics in the Prometheus text format."""
+        report = self.report()
+        lines = [
+            '# TYPE stage_seconds counter',
+            *['stage_seconds{{stage="{}"}} {}'.format(k, v['seconds'])
+              for k, v in report['stages'].items()],
+            '# TYPE stage_calls counter',
+            *['stage_calls{{stage="{}"}} {}'.format(k, v['calls'])
+              for k, v in report['stages'].items()],
+            '# TYPE stage_peak_memory_bytes gauge',
+            *['stage_peak_memory_bytes{{stage="{}"}} {}'.format(
+                k, v['peak_memory'])
+              for k, v in report['stages'].items()
+              if v['peak_memory'] is not None],
+            '# TYPE latency_seconds histogram'
+        ]
+        for name, histogram in report['latency'].items():
+            for bound, n in histogram['buckets']:
+                lines.append(
+                    'latency_seconds_bucket{{function="{}",le="{}"}} {}'.
+                    format(name, '+Inf' if bound == float('inf') else bound,
+                           n))
+            lines.append('latency_seconds_sum{{function="{}"}} {}'.format(
+                name, histogram['sum']))
+            lines.append('latency_seconds_count{{function="{}"}} {}'.format(
+                name, histogram['count']))
+        if report['peak_memory'] is not None:
+            lines += [
+                '# TYPE process_peak_memory_bytes gauge',
+                'process_peak_memory_bytes {}'.format(report['peak_memory'])
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics of this process, shared by the modules that record stages
+metrics = Metrics()
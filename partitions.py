@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+import glob # For finding the files of a partition
+import os # For partition paths
+import shutil # For clearing old partitions
+from concurrent.futures import ProcessPoolExecutor # For parallel partitions
+
+# For restoring compact dtypes across files
+from schema import compact
+
+
+def reset_partitions(directory):
+    """Remove any partitions left by an earlier run."""
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def partition_path(directory, name, bucket, part):
+    """Return the path of one part (write) of one bucket of a frame."""
+    return os.path.join(directory, '%s-%03d-%05d.feather' % (name, bucket,
+                                                             part))
+
+
+def write_partitions(frame, directory, name, n_partitions, part=0):
+    """Hash-bucket a frame by email_key and write each bucket to disk.
+    A frame can be written in several parts (such as the chunks of a
+    streamed query), numbered with part; every call writes a file for every
+    bucket, so each bucket of each name always has at least one file.
+    Rows with the same email_key always land in the same bucket.
+    """
+    buckets = frame['email_key'].to_numpy().view(np.uint64) % np.uint64(
+        n_partitions)
+    for i in range(n_partitions):
+        frame[buckets == i].reset_index(drop=True).to_feather(
+            partition_path(directory, name, i, part))
+
+
+def read_partition(directory, name, bucket):
+    """Read every part of one bucket of a frame into one DataFrame."""
+    paths = sorted(glob.glob(os.path.join(directory,
+                                          '%s-%03d-*.feather' % (name,
+                                                                 bucket))))
+    return compact(pd.concat([pd.read_feather(i) for i in paths],
+                             ignore_index=True))
+
+
+def _apply(function, directory, names, bucket, args):
+    frames = [read_partition(directory, i, bucket) for i in names]
+    return function(*frames, *args)
+
+
+def map_partitions(function, directory, names, n_partitions, processes=None,
+                   args=()):
+    """Call function(*frames, *args) on each bucket across a process pool.
+    frames holds that bucket of each frame in names, so a join of those
+    frames on email_key can be done one bucket at a time; only one bucket
+    per process is in memory. function must be importable from a module.
+    Yields the results in bucket order as they are ready.
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        yield from executor.map(_apply, [function] * n_partitions,
+                                [directory] * n_partitions,
+                                [names] * n_partitions, range(n_partitions),
+                                [args] * n_partitions)
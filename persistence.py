@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import pandas as pd
+
+# Other utilities
+import io # For buffering rows to COPY
+
+# Normalized table with one row per applicant assigned to a campaign
+campaign_table = 'campaign_assignments'
+
+assignment_columns = ['hashed_email_address', 'campaign_date', 'condition']
+
+create_table_query = """
+CREATE TABLE IF NOT EXISTS {table} (
+    hashed_email_address TEXT NOT NULL,
+    campaign_date DATE NOT NULL,
+    condition TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {table}_campaign_date_idx
+    ON {table} (campaign_date);
+""".format(table=campaign_table)
+
+
+def write_assignments(assignments, connection):
+    """Bulk load assignments into the campaign table with COPY FROM STDIN.
+    The assignments need hashed_email_address, campaign_date and condition
+    columns. Campaigns being written replace any rows already stored for
+    them, so re-running a day's job doesn't duplicate its assignments.
+    """
+    campaign_dates = pd.to_datetime(
+        assignments['campaign_date']).dt.date.unique().tolist()
+
+    # Write the rows to an in-memory CSV buffer for COPY
+    buffer = io.StringIO()
+    assignments[assignment_columns].to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+
+    cur = connection.cursor()
+    try:
+        cur.execute(create_table_query)
+        cur.execute(
+            'DELETE FROM {} WHERE campaign_date = ANY(%s);'.format(
+                campaign_table), (campaign_dates, ))
+        cur.copy_expert(
+            'COPY {} ({}) FROM STDIN WITH (FORMAT csv);'.format(
+                campaign_table, ', '.join(assignment_columns)), buffer)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cur.close()
+        connection.close()
+
+
+def read_assignments(engine, campaigns=None, since=None):
+    """Read assignments for the requested campaigns only.
+    campaigns is a list of campaign dates and since an earliest campaign
+    date; with neither, every campaign is read. Uses the index on
+    campaign_date.
+    """
+    query = 'SELECT {} FROM {}'.format(', '.join(assignment_columns),
+                                       campaign_table)
+    params = {}
+    if campaigns is not None:
+        query += ' WHERE campaign_date = ANY(%(campaigns)s)'
+        params['campaigns'] = [
+            i.date() for i in pd.to_datetime(pd.Series(campaigns))
+        ]
+    elif since is not None:
+        query += ' WHERE campaign_date >= %(since)s'
+        params['since'] = pd.to_datetime(since).date()
+    assignments = pd.read_sql_query(query + ';', engine, params=params)
+    assignments['campaign_date'] = pd.to_datetime(
+        assignments['campaign_date'])
+    return assignments
+
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+import hashlib # For deriving a hash key from the campaign
+
+
+def campaign_key(campaign):
+    """Return the 16 character hash key used for a campaign."""
+    return hashlib.md5(str(campaign).encode('utf-8')).hexdigest()[:16]
+
+
+def hash_buckets(emails, campaign):
+    """Map each email to a number in [0, 1) that depends only on the email
+    and the campaign, so it is the same in every run, batch or partition.
+    """
+    hashes = pd.util.hash_array(np.asarray(emails, dtype=object),
+                                hash_key=campaign_key(campaign),
+                                categorize=False)
+
+    # Use the top 53 bits, which a float holds exactly
+    return (hashes >> np.uint64(11)).astype(np.float64) / 2.0**53
+
+
+def assign_groups(emails, campaign, groups):
+    """Assign each email to a group for a campaign.
+    groups is a DataFrame with 'group' and 'size' columns (as at the top of
+    assignment.py); sizes are normalized here. Returns a NumPy array of
+    group names aligned with emails. Assignment is deterministic, so
+    re-running a campaign gives everyone the same group.
+    """
+    sizes = np.asarray(groups['size'], dtype=np.float64)
+    bounds = np.cumsum(sizes / sizes.sum())
+    bucket = np.searchsorted(bounds, hash_buckets(emails, campaign),
+                             side='right')
+
+    # Guard against the last bound rounding to just below one
+    bucket = np.minimum(bucket, len(bounds) - 1)
+    return np.asarray(groups['group'], dtype=object)[bucket]
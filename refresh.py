@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Other utilities
+import threading # For rebuilding in the background
+import time # For recording when a snapshot was built
+import traceback # For reporting failed rebuilds
+
+# For querying the campaign data
+from campaign_store import CampaignStore
+
+
+class Snapshot:
+    """One complete build of the aggregated campaign data.
+    Snapshots are never changed once built; a refresh builds a new one.
+    """
+    def __init__(self, data, version):
+        self.data = data
+        self.store = CampaignStore(data)
+        self.version = version
+        self.built_at = time.time()
+
+
+class SnapshotRefresher:
+    """Keeps the current Snapshot and rebuilds it in a background thread.
+    build is a function returning the aggregated campaign data (a DataFrame
+    or a dictionary of column arrays). Rebuilds run every interval seconds
+    (if given) or when refresh() is called; if build returns the same data
+    as before, the current snapshot is kept. The new snapshot replaces the
+    old one in a single assignment, so readers of current always see a
+    complete snapshot and never wait on a rebuild.
+    """
+    def __init__(self, build, interval=None, on_swap=()):
+        self.build = build
+        self.interval = interval
+        self.on_swap = list(on_swap)
+        self.current = Snapshot(build(), version=1)
+        self._requested = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background thread (once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='snapshot-refresh',
+                                            daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        """Ask for a rebuild as soon as possible; returns immediately."""
+        self._requested.set()
+
+    def rebuild(self):
+        """Build a new snapshot in this thread and swap it in."""
+        data = self.build()
+        if data is self.current.data:
+            return self.current
+        snapshot = Snapshot(data, version=self.current.version + 1)
+        self.current = snapshot
+        for i in self.on_swap:
+            i()
+        return snapshot
+
+    def _run(self):
+        while True:
+            self._requested.wait(self.interval)
+            self._requested.clear()
+            try:
+                self.rebuild()
+            except Exception:
+                # Keep serving the last good snapshot
+                traceback.print_exc()
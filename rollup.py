@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+import os # For rollup paths
+
+# For aggregating campaigns and testing lift
+from campaigns import aggregate_campaigns
+from significance import fisher_pvalues
+
+# Files of the rollup, one per level
+rollup_levels = ['daily', 'weekly', 'totals']
+
+
+class Rollup:
+    """Campaign counts for every cohort, aggregated once for comparisons
+    across cohorts.
+    daily has one row per Cohort, Campaign, Condition and Date with Counts
+    and Size, weekly the same counts summed per week (Week is its Monday),
+    and totals one row per Cohort, Campaign and Condition with the
+    submissions over the whole cohort, the lift over the campaign's control
+    (percent) and its p-value. Labels are categoricals and counts 32-bit
+    integers, and each level is stored as a Feather file.
+    """
+    def __init__(self, daily, weekly, totals):
+        self.daily = daily
+        self.weekly = weekly
+        self.totals = totals
+
+    @classmethod
+    def build(cls, applicants, assignments):
+        """Aggregate the campaigns of every cohort.
+        applicants has one row per applicant (email_key, cohort and
+        application_submission_date rounded to the day) and assignments one
+        row per assignment (email_key, Campaign and Condition). A campaign
+        belongs to the cohort most of its assigned applicants are in (or,
+        if none of them has applied, the last cohort to open by the
+        campaign's date), and a cohort's applicants are those whose latest
+        submission is in it plus everyone assigned to its campaigns, as on
+        the dashboard for the current session.
+        """
+        starts = applicants.groupby(
+            'cohort', observed=True)['application_submission_date'].min()
+        starts = starts.dropna().sort_values()
+
+        # Cohort of each campaign from its assigned applicants
+        members = assignments[['email_key', 'Campaign']].drop_duplicates()
+        members = members.assign(
+            Campaign=members['Campaign'].astype(object)).merge(
+                applicants.loc[applicants['cohort'].notna(),
+                               ['email_key', 'cohort']].assign(
+                                   cohort=lambda x: x['cohort'].astype(
+                                       object)),
+                on='email_key')
+        modal = members.groupby(['Campaign', 'cohort']).size().rename(
+            'n').reset_index().sort_values(
+                'n', ascending=False,
+                kind='mergesort').drop_duplicates('Campaign').set_index(
+                    'Campaign')['cohort']
+        campaign_cohorts = {}
+        for campaign in pd.unique(assignments['Campaign'].astype(object)):
+            if campaign in modal.index:
+                campaign_cohorts[campaign] = modal[campaign]
+                continue
+            date = pd.to_datetime(campaign, format='%m/%d/%Y')
+            opened = starts[starts.dt.normalize() <= date]
+            if len(opened):
+                campaign_cohorts[campaign] = opened.index[-1]
+        assignment_cohorts = assignments['Campaign'].astype(object).map(
+            campaign_cohorts)
+
+        daily = []
+        for cohort in sorted(set(campaign_cohorts.values()),
+                             key=lambda x: starts.get(x, pd.Timestamp.max)):
+            cohort_assignments = assignments[(assignment_cohorts ==
+                                              cohort).to_numpy()]
+            cohort_applicants = applicants.loc[
+                applicants['cohort'] == cohort,
+                ['email_key', 'application_submission_date']].merge(
+                    cohort_assignments[['email_key']].drop_duplicates(),
+                    how='outer',
+                    on='email_key')
+            daily.append(
+                aggregate_campaigns(cohort_applicants, cohort_assignments,
+                                    key='email_key').assign(Cohort=cohort))
+
+        # No cohort has campaigns: empty levels
+        if not daily:
+            daily = [
+                pd.DataFrame({
+                    'Cohort': pd.Series(dtype=object),
+                    'Campaign': pd.Series(dtype=object),
+                    'Condition': pd.Series(dtype=object),
+                    'Date': pd.Series(dtype='datetime64[ns]'),
+                    'Counts': pd.Series(dtype=np.int64),
+                    'Size': pd.Series(dtype=np.int64)
+                })
+            ]
+        daily = pd.concat(daily, ignore_index=True)[[
+            'Cohort', 'Campaign', 'Condition', 'Date', 'Counts', 'Size'
+        ]]
+        daily = daily.astype({
+            'Cohort': 'category',
+            'Campaign': 'category',
+            'Condition': 'category',
+            'Counts': np.int32,
+            'Size': np.int32
+        })
+
+        # Weekly counts
+        keys = ['Cohort', 'Campaign', 'Condition']
+        weekly = daily.assign(
+            Week=daily['Date'].dt.to_period('W').dt.start_time).groupby(
+                keys + ['Week'], observed=True).agg({
+                    'Counts': 'sum',
+                    'Size': 'first'
+                }).reset_index()
+
+        # Totals over each cohort, with lift and p-values of the treatments
+        totals = daily.groupby(keys, observed=True).agg({
+            'Counts': 'sum',
+            'Size': 'first'
+        }).reset_index()
+        control = totals[totals['Condition'] == 'Control'][[
+            'Cohort', 'Campaign', 'Counts', 'Size'
+        ]]
+        totals = totals.merge(control,
+                              how='left',
+                              on=['Cohort', 'Campaign'],
+                              suffixes=('', ' Control'))
+        treatment = (totals['Condition'] != 'None') & (
+            totals['Condition'] != 'Control') & totals['Size Control'].notna()
+        totals['Lift'] = np.nan
+        totals['p'] = np.nan
+        rows = totals[treatment]
+        totals.loc[treatment, 'Lift'] = (
+            (rows['Counts'] / rows['Size']) /
+            (rows['Counts Control'] / rows['Size Control']) - 1) * 100
+        if treatment.any():
+            totals.loc[treatment, 'p'] = fisher_pvalues(
+                np.stack([
+                    rows['Counts'], rows['Size'] - rows['Counts'],
+                    rows['Counts Control'],
+                    rows['Size Control'] - rows['Counts Control']
+                ],
+                         axis=1).astype(np.float64))
+        totals = totals[keys + ['Counts', 'Size', 'Lift', 'p']].reset_index(
+            drop=True)
+        return cls(daily, weekly, totals)
+
+    def save(self, directory):
+        """Write each level to directory, replacing files in one step."""
+        os.makedirs(directory, exist_ok=True)
+        for i in rollup_levels:
+            path = os.path.join(directory, i + '.feather')
+            getattr(self, i).to_feather(path + '.tmp')
+            os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, directory):
+        """Read a rollup written by save."""
+        return cls(*[
+            pd.read_feather(os.path.join(directory, i + '.feather'))
+            for i in rollup_levels
+        ])
+
+    def cohorts(self):
+        """Return the cohorts with campaigns, oldest first."""
+        return list(pd.unique(self.totals['Cohort'].astype(object)))
+
+    def lift(self, cohorts=None):
+        """Return the totals of the treatments (lift and p-value) for the
+        cohorts given, or every cohort.
+        """
+        totals = self.totals[self.totals['Lift'].notna()]
+        if cohorts is not None:
+            totals = totals[totals['Cohort'].isin(cohorts)]
+        return totals
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Low-cardinality columns held as categoricals
+categorical_columns = [
+    'program', 'status', 'session', 'cohort', 'Campaign', 'Condition'
+]
+
+
+def email_keys(emails):
+    """Return a 64-bit integer key for each hashed email address.
+    Merging, deduplicating and grouping on these keys avoids hashing Python
+    strings every time. Keys come from a 64-bit hash of the address, so
+    equal addresses always get equal keys (missing addresses share one key,
+    just as they match each other in a merge).
+    """
+    return pd.util.hash_array(np.asarray(emails, dtype=object),
+                              categorize=False).view(np.int64)
+
+
+def memory_usage(frame):
+    """Return the bytes held by a DataFrame, including Python strings."""
+    return frame.memory_usage(deep=True).sum()
+
+
+def compact(frame, name=None, sizes=None):
+    """Convert a frame to compact dtypes as it is ingested.
+    Adds an email_key column (see email_keys) next to hashed_email_address
+    and turns the low-cardinality columns into categoricals; the addresses
+    themselves are kept for output. Converting an already compact frame
+    changes nothing. With name and sizes (a dictionary), records the memory
+    used before and after under the name.
+    """
+    before = memory_usage(frame) if sizes is not None else None
+    frame = frame.copy()
+    if 'hashed_email_address' in frame and 'email_key' not in frame:
+        frame['email_key'] = email_keys(frame['hashed_email_address'])
+    for i in categorical_columns:
+        if i in frame and not pd.api.types.is_categorical_dtype(frame[i]):
+            frame[i] = frame[i].astype('category')
+    if sizes is not None:
+        sizes[name] = (before, memory_usage(frame))
+    return frame
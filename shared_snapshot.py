@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+
+# Other utilities
+import fcntl # For letting one worker build at a time
+import os # For snapshot paths
+import shutil # For removing old snapshots
+import time # For naming and ageing snapshots
+
+# For the column order of the aggregated campaign data
+from campaign_store import CampaignStore, store_columns
+
+
+class SharedSnapshot:
+    """Aggregated campaign data stored once on disk as one .npy file per
+    column, for every gunicorn worker to memory-map.
+    The first worker to find the snapshot missing or stale builds it while
+    holding a file lock; the others wait and then map the result, so the
+    database is queried once and the workers share one copy of the data in
+    the page cache. Each build goes to a new directory and the CURRENT file
+    is switched to it atomically, along with anything built with the data
+    (such as a Rollup) saved in a subdirectory of it.
+    """
+    def __init__(self, directory, max_age=None):
+        self.directory = directory
+        self.max_age = max_age
+        self._version = None
+        self._columns = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def current_version(self):
+        """Return the name of the current snapshot, or None."""
+        try:
+            with open(self._path('CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def expire(self):
+        """Mark the snapshot as stale so that the next load rebuilds it."""
+        open(self._path('REFRESH'), 'w').close()
+
+    def age(self):
+        """Return the seconds since the current snapshot was written, or
+        None if there is none (or a rebuild has been asked for).
+        """
+        if self.current_version() is None or os.path.exists(
+                self._path('REFRESH')):
+            return None
+        return time.time() - os.path.getmtime(self._path('CURRENT'))
+
+    def stale(self):
+        """Return True if the snapshot is missing, too old or expired."""
+        age = self.age()
+        if age is None:
+            return True
+        return self.max_age is not None and age > self.max_age
+
+    def write(self, all_campaigns, extras=None):
+        """Write aggregated campaign data as a new snapshot and make it
+        current. extras maps names to objects with a save(directory) method,
+        each saved in a subdirectory of the snapshot (see extra_path).
+        Returns the new version.
+        """
+        columns = CampaignStore(all_campaigns).columns
+        version = '%d' % (time.time() * 1e6)
+        temporary = self._path('tmp-' + version)
+        os.makedirs(temporary)
+        for name, extra in (extras or {}).items():
+            extra.save(os.path.join(temporary, name))
+        for i in store_columns:
+            column = columns[i]
+            if column.dtype == object:
+                # Fixed-width strings can be mapped; Python objects can't
+                column = column.astype(str)
+            np.save(os.path.join(temporary, i + '.npy'), column)
+        os.rename(temporary, self._path(version))
+
+        # Switch CURRENT to the new snapshot in one step
+        with open(self._path('CURRENT.tmp'), 'w') as f:
+            f.write(version)
+        os.replace(self._path('CURRENT.tmp'), self._path('CURRENT'))
+        if os.path.exists(self._path('REFRESH')):
+            os.remove(self._path('REFRESH'))
+
+        # Remove all but the last two snapshots; workers still mapping an
+        # older one keep their pages until they move on
+        versions = sorted(i for i in os.listdir(self.directory) if i.isdigit())
+        for i in versions[:-2]:
+            shutil.rmtree(self._path(i), ignore_errors=True)
+        return version
+
+    def read(self, version):
+        """Memory-map the columns of a snapshot (read only, no copy)."""
+        return {
+            i: np.load(os.path.join(self._path(version), i + '.npy'),
+                       mmap_mode='r')
+            for i in store_columns
+        }
+
+    def version_of(self, columns):
+        """Return the version whose memory-mapped columns these are (as
+        returned by load), or None.
+        """
+        filename = getattr(columns.get(store_columns[0]), 'filename', None)
+        if filename is None:
+            return None
+        return os.path.basename(os.path.dirname(filename))
+
+    def extra_path(self, name, version):
+        """Return the directory of what was saved under name with a
+        version, or None if there is none.
+        """
+        if version is None:
+            return None
+        path = os.path.join(self._path(version), name)
+        return path if os.path.isdir(path) else None
+
+    def load(self, build):
+        """Return the current snapshot's columns, building it first with
+        build() if it is stale. build returns the aggregated campaign data,
+        or the data and a dictionary of extras to save with them (see
+        write). The same arrays are returned until a new version appears.
+        """
+        if self.stale():
+            with open(self._path('build.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    # Another worker may have built it while we waited
+                    if self.stale():
+                        built = build()
+                        if isinstance(built, tuple):
+                            self.write(*built)
+                        else:
+                            self.write(built)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+        version = self.current_version()
+        if version != self._version:
+            self._columns = self.read(version)
+            self._version = version
+        return self._columns
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For analyses
+import numpy as np
+from functools import lru_cache # For caching exact tests
+
+# For fishers exact test
+from scipy import stats
+
+# Tables with more applicants than this use a chi-square approximation
+# instead of the exact test
+exact_limit = 100000
+
+# Number of distinct tables whose exact p-values are kept
+cache_size = 4096
+
+
+@lru_cache(maxsize=cache_size)
+def fisher_exact(a, b, c, d):
+    """Two-sided p-value of Fisher's exact test for [[a, b], [c, d]].
+    Results are cached by the table's contents.
+    """
+    return stats.fisher_exact([[a, b], [c, d]])[1]
+
+
+def chi_square(tables):
+    """Two-sided p-values for an array of 2x2 tables from the chi-square test
+    with Yates' continuity correction, computed for all tables at once.
+    """
+    tables = np.asarray(tables, dtype=np.float64)
+    rows = tables.sum(axis=2)
+    columns = tables.sum(axis=1)
+    total = rows.sum(axis=1)
+    expected = rows[:, :, None] * columns[:, None, :] / np.where(
+        total == 0, 1, total)[:, None, None]
+    difference = np.abs(tables - expected)
+    corrected = np.maximum(difference - 0.5, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = np.where(expected > 0, corrected**2 / expected, 0).sum(
+            axis=(1, 2))
+    return stats.chi2.sf(statistic, 1)
+
+
+def fisher_pvalues(tables, exact_limit=exact_limit):
+    """Return p-values for a list of 2x2 (treatment, control) tables.
+    Each table is [[treatment submitted, treatment not submitted],
+    [control submitted, control not submitted]]. Tables with at most
+    exact_limit applicants get Fisher's exact test (cached); larger ones a
+    vectorized chi-square approximation. Returns a NumPy array.
+    """
+    tables = np.asarray(tables, dtype=np.float64).reshape(-1, 2, 2)
+    if (tables < 0).any():
+        raise ValueError('All values in the tables must be nonnegative.')
+
+    p_values = np.empty(len(tables))
+    large = tables.sum(axis=(1, 2)) > exact_limit
+    if large.any():
+        p_values[large] = chi_square(tables[large])
+    for i in np.flatnonzero(~large):
+        p_values[i] = fisher_exact(*(int(round(x)) for x in tables[i].ravel()))
+    return p_values
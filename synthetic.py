@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+import argparse # For the command line
+import io # For buffering rows to COPY
+from sqlalchemy import create_engine, text # For loading the tables
+
+# For the layout of the source tables and assigning groups
+from extraction import apps_columns
+from cleaning import writing_questions
+from persistence import campaign_table
+from randomization import assign_groups
+
+# Programs applicants choose (None for no program yet), and how often
+programs = pd.Series({
+    'Data Science': .35,
+    'Artificial Intelligence': .15,
+    'Data Engineering': .15,
+    'Health Data Science': .10,
+    'DevOps': .10,
+    'Security': .05,
+    None: .10
+})
+
+# Stages of finished applications in greenhouse, and how often
+statuses = pd.Series({
+    'Application Review': .40,
+    'Interview': .20,
+    'Rejected': .30,
+    'Accepted': .10
+})
+
+# Groups of every campaign, as at the top of assignment.py, and the chance
+# each group submits an application once nudged
+groups = pd.DataFrame({
+    'Control': .20, 'Generic': .40, 'Personalized': .40
+    }.items(), columns=['group', 'size'])
+submit_rates = {'Control': .30, 'Generic': .34, 'Personalized': .38}
+
+# Chance of submitting without a campaign, of being assigned to one of the
+# cohort's campaigns, of an earlier submission in the previous cohort, of a
+# gibberish application and of answering each free-text question
+submit_rate = .30
+assigned_share = .30
+repeat_share = .10
+gibberish_share = .03
+answer_rate = .40
+
+# Sessions per year and days in each cohort
+sessions = ['A', 'B', 'C']
+cohort_days = 122
+
+# Answers to the free-text questions
+answers = np.array([
+    'I want to apply machine learning to problems in health care',
+    'Built a data pipeline with Spark and Airflow for a research lab',
+    'Mostly Python and SQL, some Scala and a little Rust',
+    'A team of four working on a shared codebase of about 20k lines',
+    'I used mixed models and bootstrapping in my dissertation',
+    'Trade-offs between latency and cost when caching results'
+], dtype=object)
+gibberish = np.array(['asdfgh', 'qwerty', 'zxcvbnm', 'hjkl'], dtype=object)
+
+
+def email_addresses(rng, n):
+    """Return n random hashed email addresses (32 hex characters)."""
+    hex_digits = np.array(['%02x' % i for i in range(256)], dtype='S2')
+    digits = hex_digits[rng.integers(0, 256, size=(n, 16))]
+    return digits.view('S32').ravel().astype(str).astype(object)
+
+
+def cohort_windows(n_cohorts, end=None):
+    """Return the year, session, start and end of each cohort, the last one
+    ending at end (today by default) so its applicants are still recent.
+    """
+    end = pd.to_datetime('today').normalize() if end is None else end
+    starts = end - pd.to_timedelta(
+        np.arange(n_cohorts, 0, -1) * cohort_days, unit='D')
+    windows = pd.DataFrame({
+        'year': starts.year,
+        'start': starts,
+        'end': starts + pd.Timedelta(days=cohort_days)
+    })
+
+    # Sessions restart every year, so later cohorts sort after earlier ones
+    windows['session'] = np.asarray(sessions)[windows.groupby(
+        'year').cumcount().to_numpy()]
+    return windows[['year', 'session', 'start', 'end']]
+
+
+def campaign_dates(windows, n_campaigns, rng):
+    """Spread campaigns over the cohorts, each in the first two thirds of
+    its cohort. Returns the cohort and date of each campaign, by date.
+    """
+    cohort = np.arange(n_campaigns) % len(windows)
+    offsets = rng.integers(0, cohort_days * 2 // 3, size=n_campaigns)
+    dates = windows['start'].to_numpy()[cohort] + pd.to_timedelta(
+        offsets, unit='D').to_numpy()
+    campaigns = pd.DataFrame({'cohort': cohort, 'date': dates})
+    return campaigns.drop_duplicates('date').sort_values(
+        'date').reset_index(drop=True)
+
+
+def _choice(rng, weights, size):
+    return np.asarray(weights.index, dtype=object)[rng.choice(
+        len(weights), size=size, p=weights.to_numpy() / weights.sum())]
+
+
+def _between(rng, low, high):
+    # Uniform random times between two arrays of datetimes
+    span = (high - low) / np.timedelta64(1, 's')
+    return low + (rng.random(len(low)) * span).astype(
+        'timedelta64[s]')
+
+
+def generate(n_applicants, n_campaigns=20, n_cohorts=4, seed=0,
+             chunksize=500000):
+    """Generate the source tables for n_applicants, chunk by chunk.
+    Yields (table, DataFrame) pairs for consulting_heroku_export,
+    completed_apps and the campaign table, with the columns the queries in
+    extraction.py and persistence.py expect. Every column is drawn with
+    NumPy array operations, so a chunk of a million applicants takes
+    seconds. Applicants assigned to a campaign get their group from
+    randomization.assign_groups and submit at their group's rate.
+    """
+    rng = np.random.default_rng(seed)
+    windows = cohort_windows(n_cohorts)
+    campaigns = campaign_dates(windows, n_campaigns, rng)
+    campaign_names = ('campaign_' +
+                      campaigns['date'].dt.strftime('%m/%d/%Y')).to_numpy()
+    today = pd.to_datetime('today').normalize().to_datetime64()
+
+    for first in range(0, n_applicants, chunksize):
+        n = min(chunksize, n_applicants - first)
+        emails = email_addresses(rng, n)
+        cohort = rng.integers(0, n_cohorts, size=n)
+        start = windows['start'].to_numpy()[cohort]
+        end = windows['end'].to_numpy()[cohort]
+
+        # Unfinished applications, some started before their cohort
+        created_at = _between(rng, start - np.timedelta64(60, 'D'), end)
+        updated_at = _between(rng, created_at, np.minimum(end, today))
+        apps = pd.DataFrame({
+            'hashed_email_address': emails,
+            'program': _choice(rng, programs, n),
+            'created_at': created_at,
+            'updated_at': updated_at
+        })
+        is_gibberish = rng.random(n) < gibberish_share
+        for i in writing_questions:
+            answered = rng.random(n) < answer_rate
+            apps[i] = np.where(
+                is_gibberish, gibberish[rng.integers(0, len(gibberish), n)],
+                np.where(answered, answers[rng.integers(0, len(answers), n)],
+                         ''))
+        yield 'consulting_heroku_export', apps[apps_columns]
+
+        # Assign some applicants to one of their cohort's campaigns
+        in_cohort = [np.flatnonzero(campaigns['cohort'] == i)
+                     for i in range(n_cohorts)]
+        has_campaign = np.array([len(i) > 0 for i in in_cohort])[cohort]
+        assigned = has_campaign & (rng.random(n) < assigned_share)
+        campaign = np.full(n, -1)
+        for i in range(n_cohorts):
+            rows = assigned & (cohort == i)
+            if rows.any():
+                campaign[rows] = rng.choice(in_cohort[i], size=rows.sum())
+        condition = np.full(n, None, dtype=object)
+        for i in np.unique(campaign[assigned]):
+            rows = campaign == i
+            condition[rows] = assign_groups(emails[rows], campaign_names[i],
+                                            groups)
+        yield campaign_table, pd.DataFrame({
+            'hashed_email_address': emails[assigned],
+            'campaign_date': campaigns['date'].to_numpy()[campaign[assigned]],
+            'condition': condition[assigned]
+        })
+
+        # Finished applications; nudged applicants submit after the campaign
+        # at their group's rate
+        rates = np.full(n, submit_rate)
+        for name, rate in submit_rates.items():
+            rates[condition == name] = rate
+        submitted = rng.random(n) < rates
+        submitted_after = np.where(
+            assigned,
+            campaigns['date'].to_numpy()[np.maximum(campaign, 0)], start)
+        submitted_at = _between(rng, submitted_after, np.minimum(end, today))
+        completed = pd.DataFrame({
+            'hashed_email_address': emails,
+            'year': windows['year'].to_numpy()[cohort],
+            'session': windows['session'].to_numpy()[cohort],
+            'application_submission_date': submitted_at,
+            'currnent_stage_in_greenhouse': _choice(rng, statuses, n),
+            'do_not_interview_tag': rng.random(n) < .02
+        })[submitted]
+
+        # Some applied in the previous cohort as well
+        repeat = (rng.random(len(completed)) < repeat_share) & (
+            cohort[submitted] > 0)
+        earlier = completed[repeat].copy()
+        previous = cohort[submitted][repeat] - 1
+        earlier['year'] = windows['year'].to_numpy()[previous]
+        earlier['session'] = windows['session'].to_numpy()[previous]
+        earlier['application_submission_date'] = _between(
+            rng, windows['start'].to_numpy()[previous],
+            windows['end'].to_numpy()[previous])
+        earlier['currnent_stage_in_greenhouse'] = 'Rejected'
+        yield 'completed_apps', pd.concat([completed, earlier],
+                                          ignore_index=True)
+
+
+def generate_frames(n_applicants, **kwargs):
+    """Generate the source tables as one DataFrame per table."""
+    chunks = {}
+    for table, chunk in generate(n_applicants, **kwargs):
+        chunks.setdefault(table, []).append(chunk)
+    return {
+        table: pd.concat(frames, ignore_index=True)
+        for table, frames in chunks.items()
+    }
+
+
+def _copy_rows(table, connection, keys, data_iter):
+    # Load rows into Postgres with COPY instead of INSERTs
+    buffer = io.StringIO()
+    pd.DataFrame(list(data_iter)).to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    cur = connection.connection.cursor()
+    cur.copy_expert(
+        'COPY {} ({}) FROM STDIN WITH (FORMAT csv);'.format(
+            table.name, ', '.join(keys)), buffer)
+    cur.close()
+
+
+def load(chunks, engine):
+    """Load generated chunks into a database (SQLite or Postgres), replacing
+    the tables, and index the columns the jobs filter on. Returns the rows
+    loaded per table.
+    """
+    method = _copy_rows if engine.dialect.name == 'postgresql' else None
+    rows = {}
+    for table, chunk in chunks:
+        chunk.to_sql(table,
+                     engine,
+                     if_exists='append' if table in rows else 'replace',
+                     index=False,
+                     chunksize=100000,
+                     method=method)
+        rows[table] = rows.get(table, 0) + len(chunk)
+    with engine.begin() as connection:
+        for table, column in [('completed_apps',
+                               'application_submission_date'),
+                              ('consulting_heroku_export', 'updated_at'),
+                              (campaign_table, 'campaign_date')]:
+            connection.execute(
+                text('CREATE INDEX IF NOT EXISTS {0}_{1}_idx ON {0} ({1});'.
+                     format(table, column)))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Load synthetic applications into a database.')
+    parser.add_argument('--applicants', type=int, default=10000)
+    parser.add_argument('--campaigns', type=int, default=20)
+    parser.add_argument('--cohorts', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', default='sqlite:///synthetic.db',
+                        help='SQLAlchemy URL of the database to load')
+    args = parser.parse_args()
+    rows = load(
+        generate(args.applicants, n_campaigns=args.campaigns,
+                 n_cohorts=args.cohorts, seed=args.seed),
+        create_engine(args.database))
+    for table, n in rows.items():
+        print('Loaded {:,} rows into {}'.format(n, table))
@@ -0,0 +1,5 @@
+# The modules live at the top of the repository
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
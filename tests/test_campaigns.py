@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+import os # For finding the demo data
+import re # For campaign names
+
+# For aggregating campaigns
+from campaigns import to_long, aggregate_campaigns
+
+simulated_data = os.path.join(os.path.dirname(__file__), os.pardir,
+                              'simulated_data.csv')
+
+
+def loop_campaigns(df_dash):
+    """The per-column loop the dashboard used before aggregate_campaigns."""
+    campaign_names = df_dash.filter(regex='campaign', axis=1).columns.tolist()
+    all_campaigns = pd.DataFrame(
+        columns=['Date', 'Condition', 'Counts', 'Campaign', 'Size'])
+    for i in campaign_names:
+        df_dash[i].fillna(value="None", inplace=True)
+        counts = df_dash.groupby(
+            by=['application_submission_date', i]).size().reset_index()
+        counts.columns = ['Date', 'Condition', 'Counts']
+        min_date = counts.Date.min()
+        max_date = counts.Date.max()
+        counts.set_index(['Date', 'Condition'], inplace=True)
+        application_range = pd.date_range(min_date, max_date)
+        conditions = pd.Series(df_dash[i].unique()).sort_values()
+        new_index = pd.MultiIndex.from_product(
+            [application_range, conditions], names=['Date', 'Condition'])
+        counts = counts.reindex(new_index).reset_index()
+        counts.fillna(value=0, inplace=True)
+        counts['Campaign'] = re.search('campaign_(.*)', i).group(1)
+        condition_dictionary = df_dash[i].value_counts().to_dict()
+        counts['Size'] = counts['Condition'].map(condition_dictionary)
+        all_campaigns = pd.concat([all_campaigns, counts])
+    return all_campaigns
+
+
+def normalize(all_campaigns):
+    all_campaigns = all_campaigns.astype({
+        'Condition': object,
+        'Campaign': object,
+        'Counts': np.int64,
+        'Size': np.int64
+    })
+    return all_campaigns.sort_values(['Campaign', 'Date', 'Condition'
+                                      ]).reset_index(drop=True)
+
+
+def test_matches_loop_on_simulated_data():
+    rng = np.random.default_rng(0)
+    df_campaign = pd.read_csv(simulated_data)
+    df_campaign['campaign_06/18/2020'] = df_campaign[
+        'campaign_06/15/2020'].where(rng.random(len(df_campaign)) < .5)
+
+    # Submissions of some listed applicants and of others never listed
+    emails = pd.unique(df_campaign['hashed_email_address'])
+    submitted = np.concatenate([
+        rng.choice(emails, 3000, replace=False),
+        ['other%d' % i for i in range(2000)]
+    ])
+    all_completed = pd.DataFrame({
+        'hashed_email_address': submitted,
+        'application_submission_date': pd.Timestamp('2020-06-01') +
+        pd.to_timedelta(rng.integers(0, 60, len(submitted)), unit='D')
+    })
+
+    expected = loop_campaigns(
+        all_completed.merge(df_campaign, how='outer',
+                            on='hashed_email_address'))
+
+    assignments = to_long(df_campaign)
+    applicants = all_completed.merge(
+        assignments[['hashed_email_address']].drop_duplicates(),
+        how='outer',
+        on='hashed_email_address')
+    result = aggregate_campaigns(applicants, assignments)
+
+    pd.testing.assert_frame_equal(normalize(result), normalize(expected))
+    assert (result['Counts'] <= result['Size']).all()
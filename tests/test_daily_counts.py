@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+from sqlalchemy import create_engine # For a SQLite stand-in for Postgres
+
+# For the counts and the full aggregation they should match
+from daily_counts import DailyCounts
+from campaigns import aggregate_campaigns
+
+emails = np.array(['%032x' % i for i in range(3000)], dtype=object)
+
+
+def submissions(rng, n, start, end, sessions=('A', )):
+    """n rows of completed_apps submitted between start and end."""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    seconds = rng.integers(0, (end - start).total_seconds(), n)
+    return pd.DataFrame({
+        'hashed_email_address': rng.choice(emails, n),
+        'year': 2020,
+        'session': rng.choice(list(sessions), n),
+        'application_submission_date':
+        (start + pd.to_timedelta(seconds, unit='s')).astype(str)
+    })
+
+
+def recompute(engine, assignments):
+    """Aggregate the current session from scratch, as the dashboard does."""
+    completed = pd.read_sql_query('SELECT * FROM completed_apps', engine)
+    completed['application_submission_date'] = pd.to_datetime(
+        completed['application_submission_date'])
+    completed.sort_values('application_submission_date', ascending=False,
+                          inplace=True)
+    completed.drop_duplicates('hashed_email_address', inplace=True)
+    completed['cohort'] = completed['year'].astype(str).str.cat(
+        completed['session'])
+    current = completed[completed['cohort'] == completed['cohort'].max()]
+    session_start = current['application_submission_date'].min().normalize()
+    assignments = assignments[pd.to_datetime(
+        assignments['Campaign'], format='%m/%d/%Y') >= session_start]
+    applicants = current[[
+        'hashed_email_address', 'application_submission_date'
+    ]].merge(assignments[['hashed_email_address']].drop_duplicates(),
+             how='outer',
+             on='hashed_email_address')
+    applicants['application_submission_date'] = applicants[
+        'application_submission_date'].dt.floor('d')
+    return aggregate_campaigns(applicants, assignments)
+
+
+def check(counts, engine, assignments):
+    result = counts.update(engine, assignments)
+    pd.testing.assert_frame_equal(result, recompute(engine, assignments))
+
+
+def test_update_matches_recompute(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    engine = create_engine('sqlite:///' + str(tmp_path / 'greenhouse.db'))
+    submissions(rng, 2000, '2020-03-01', '2020-06-20').to_sql(
+        'completed_apps', engine, index=False)
+    assignments = pd.DataFrame({
+        'hashed_email_address': emails[:1500],
+        'Campaign': '06/15/2020',
+        'Condition': rng.choice(['A', 'B', 'Control'], 1500)
+    })
+    counts = DailyCounts()
+    check(counts, engine, assignments)
+
+    # From here on, updates only fold in new rows
+    def no_rebuild(*args):
+        raise AssertionError('rebuilt from scratch')
+
+    monkeypatch.setattr(DailyCounts, '_rebuild', no_rebuild)
+
+    # New submissions, some by applicants submitting again
+    for start, end in [('2020-06-20', '2020-06-25'),
+                       ('2020-06-25', '2020-07-01')]:
+        submissions(rng, 300, start, end).to_sql(
+            'completed_apps', engine, index=False, if_exists='append')
+        check(counts, engine, assignments)
+
+    # Submissions sharing the latest timestamp, arriving after the update
+    # that saw the first of them
+    latest = pd.read_sql_query(
+        'SELECT max(application_submission_date) AS latest '
+        'FROM completed_apps', engine)['latest'][0]
+    tied = submissions(rng, 5, '2020-06-01', '2020-06-02').assign(
+        application_submission_date=latest)
+    tied.to_sql('completed_apps', engine, index=False, if_exists='append')
+    check(counts, engine, assignments)
+
+    # A new campaign regroups the stored days without querying
+    assignments = pd.concat([
+        assignments,
+        pd.DataFrame({
+            'hashed_email_address': emails[1000:2000],
+            'Campaign': '06/30/2020',
+            'Condition': rng.choice(['A', 'Control'], 1000)
+        })
+    ], ignore_index=True)
+    check(counts, engine, assignments)
+
+
+def test_update_before_any_submission(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'greenhouse.db'))
+    submissions(np.random.default_rng(0), 0, '2020-03-01',
+                '2020-03-02').to_sql('completed_apps', engine, index=False)
+    assignments = pd.DataFrame({
+        'hashed_email_address': emails[:10],
+        'Campaign': '06/15/2020',
+        'Condition': 'A'
+    })
+    assert DailyCounts().update(engine, assignments).empty
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# For the gibberish filter and the questions it reads
+from gibberish import no_space_counts, keep_applications
+from cleaning import writing_questions
+
+# Responses of every kind the loop had to handle
+responses = np.array([
+    'I like data', 'nospaces', 'données sans espaces', 'ça', '数据科学',
+    '数据 科学', 'emoji🙂here', 'emoji 🙂', ' ', '   ', '\t\n', 'trailing ',
+    ' leading', 'a', ''
+], dtype=object)
+
+
+def loop_counts(all_apps):
+    """The per-column loop clean_applications used before no_space_counts."""
+    gibberish = all_apps[writing_questions].copy()
+    for i in range(gibberish.columns.size):
+        gibberish.iloc[:, i] = gibberish.iloc[:, i].str.contains(' ') == False
+    return gibberish.sum(axis=1, skipna=True)
+
+
+def random_apps(rng, n):
+    """n applications whose answers are drawn from responses or missing."""
+    answers = {}
+    for i in writing_questions:
+        column = rng.choice(responses, n)
+        column[rng.random(n) < .3] = np.nan
+        answers[i] = column
+
+    # Mostly answers without spaces, so both sides of the cutoff are common
+    gibberish = rng.random(n) < .5
+    for i in writing_questions[:8]:
+        answers[i][gibberish] = 'nospaces'
+    return pd.DataFrame(answers)
+
+
+def test_matches_loop():
+    rng = np.random.default_rng(0)
+    all_apps = random_apps(rng, 5000)
+
+    # As in clean_applications, empty strings are missing before the filter
+    all_apps = all_apps.replace('', np.nan)
+    expected = loop_counts(all_apps)
+    counts = no_space_counts(all_apps, writing_questions)
+    assert (counts.to_numpy() == expected.to_numpy()).all()
+    keep = keep_applications(all_apps, writing_questions)
+    assert (keep.to_numpy() == (expected < 5).to_numpy()).all()
+    assert 0 < keep.sum() < len(keep)
+
+
+def test_empty_strings_and_missing_values_are_not_counted():
+    all_apps = pd.DataFrame({
+        'a': ['', np.nan, 'x', 'x y'],
+        'b': [np.nan, '', 'yz', '']
+    })
+    assert no_space_counts(all_apps, ['a', 'b']).tolist() == [0, 0, 2, 0]
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import numpy as np
+import pandas as pd
+
+# Other utilities
+import hashlib # For email addresses hashed as in the databases
+
+# For assigning groups
+from randomization import assign_groups
+
+campaign = 'campaign_06/15/2020'
+
+# Groups as at the top of assignment.py
+groups = pd.DataFrame({
+    'Control': .20, 'Generic': .40, 'Personalized': .40
+}.items(), columns=['group', 'size'])
+
+emails = pd.Series([
+    hashlib.md5(('applicant%d' % i).encode()).hexdigest()
+    for i in range(20000)
+])
+
+
+def test_same_groups_whole_in_chunks_and_rerun():
+    whole = assign_groups(emails, campaign, groups)
+
+    # Shuffled chunks of uneven sizes, as from a stream or partitions
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(emails))
+    chunked = np.empty(len(emails), dtype=object)
+    for chunk in np.split(order, [10, 2500, 9000, 9001, 15000]):
+        chunked[chunk] = assign_groups(emails[chunk], campaign, groups)
+    assert (chunked == whole).all()
+
+    # Again, with sizes given as percentages
+    rerun = assign_groups(emails.to_numpy(), campaign,
+                          groups.assign(size=groups['size'] * 100))
+    assert (rerun == whole).all()
+
+    # Another campaign draws the groups afresh
+    assert (assign_groups(emails, 'campaign_06/18/2020', groups) !=
+            whole).mean() > .5
+
+
+def test_group_shares_match_sizes():
+    shares = pd.Series(assign_groups(emails, campaign, groups)).value_counts(
+        normalize=True)
+    expected = groups.set_index('group')['size']
+    assert (shares.reindex(expected.index) - expected).abs().max() < .015
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# For data management
+import pandas as pd
+
+# For the rollup
+from rollup import Rollup
+
+
+def applicants():
+    """Two cohorts; 2020B's first submission comes after its campaign."""
+    return pd.DataFrame({
+        'email_key': [1, 2, 3, 4, 5, 6],
+        'cohort': pd.Categorical(['2020A'] * 2 + ['2020B'] * 4),
+        'application_submission_date':
+        pd.to_datetime(['2020-01-02', '2020-01-20'] +
+                       ['2020-06-20', '2020-06-22', '2020-07-01', pd.NaT])
+    })
+
+
+def test_campaign_follows_its_applicants_cohort():
+    assignments = pd.DataFrame({
+        'email_key': [1, 2, 3, 4, 5, 6],
+        'Campaign': ['01/05/2020'] * 2 + ['06/15/2020'] * 4,
+        'Condition': ['A', 'Control', 'A', 'A', 'Control', 'Control']
+    })
+    totals = Rollup.build(applicants(), assignments).totals
+    campaigns = totals.groupby('Campaign', observed=True)['Cohort'].unique()
+    assert list(campaigns['01/05/2020']) == ['2020A']
+    assert list(campaigns['06/15/2020']) == ['2020B']
+    b = totals[(totals['Campaign'] == '06/15/2020')].set_index('Condition')
+    assert b.loc['A', 'Counts'] == 2
+    assert b.loc['Control', 'Counts'] == 1
+    assert b.loc['A', 'Lift'] == 100
+
+
+def test_no_campaigns():
+    assignments = pd.DataFrame({
+        'email_key': pd.Series([], dtype=int),
+        'Campaign': pd.Series([], dtype=object),
+        'Condition': pd.Series([], dtype=object)
+    })
+    rollup = Rollup.build(applicants(), assignments)
+    assert rollup.cohorts() == []
+    assert len(rollup.daily) == len(rollup.weekly) == len(rollup.totals) == 0